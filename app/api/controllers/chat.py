@@ -1,17 +1,21 @@
 import logging
-from fastapi import APIRouter
+import orjson
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 from app.schemas.chat import ChatRequest, ChatResponse, LearningPathRequest, LearningPathResponse, ChatFreeRequest, ChatFreeResponse
 from app.core.config import settings
-from app.core.container import container
+from app.api.dependencies import get_chat_service
+from app.services.chat_service import ChatService
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-chat_service = container.get_chat_service()
-
 
 @router.post("/evaluate", response_model=ChatResponse)
-async def evaluate(request: ChatRequest) -> ChatResponse:
+async def evaluate(
+    request: ChatRequest,
+    chat_service: ChatService = Depends(get_chat_service)
+) -> ChatResponse:
     answer = await chat_service.evaluate_question(
         request.question,
         request.question_uid
@@ -25,8 +29,41 @@ async def evaluate(request: ChatRequest) -> ChatResponse:
     
 
 
+def _sse(payload: dict, event: str | None = None) -> str:
+    data = f"data: {orjson.dumps(payload).decode()}\n\n"
+    return f"event: {event}\n{data}" if event else data
+
+
+@router.post("/evaluate/stream")
+async def evaluate_stream(
+    request: ChatRequest,
+    chat_service: ChatService = Depends(get_chat_service)
+) -> StreamingResponse:
+    chunks = await chat_service.stream_evaluate_question(
+        request.question,
+        request.question_uid
+    )
+    
+    async def event_stream():
+        async for chunk in chunks:
+            yield _sse({"delta": chunk})
+        yield _sse(
+            {
+                "question_uid": request.question_uid,
+                "timestamp": settings.now_string(),
+                "model_name": settings.MODEL_NAME
+            },
+            event="done"
+        )
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @router.post("/learning-path", response_model=LearningPathResponse)
-async def get_learning_path(request: LearningPathRequest) -> LearningPathResponse:
+async def get_learning_path(
+    request: LearningPathRequest,
+    chat_service: ChatService = Depends(get_chat_service)
+) -> LearningPathResponse:
         learning_path = await chat_service.get_learning_path(
             request.topics,
             request.level,
@@ -40,11 +77,36 @@ async def get_learning_path(request: LearningPathRequest) -> LearningPathRespons
 
 
 @router.post("/chat-free", response_model=ChatFreeResponse)
-async def chat_free(request: ChatFreeRequest) -> ChatFreeResponse:
+async def chat_free(
+    request: ChatFreeRequest,
+    chat_service: ChatService = Depends(get_chat_service)
+) -> ChatFreeResponse:
     answer = await chat_service.chat_free(request.message)
     return ChatFreeResponse(
         answer=answer,
         chat_uid=request.chat_uid,
         timestamp=settings.now_string(),
         model_name=settings.MODEL_NAME
-    )
\ No newline at end of file
+    )
+
+
+@router.post("/chat-free/stream")
+async def chat_free_stream(
+    request: ChatFreeRequest,
+    chat_service: ChatService = Depends(get_chat_service)
+) -> StreamingResponse:
+    chunks = chat_service.stream_chat_free(request.message)
+    
+    async def event_stream():
+        async for chunk in chunks:
+            yield _sse({"delta": chunk})
+        yield _sse(
+            {
+                "chat_uid": request.chat_uid,
+                "timestamp": settings.now_string(),
+                "model_name": settings.MODEL_NAME
+            },
+            event="done"
+        )
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
@@ -1,27 +1,48 @@
 import logging
-from fastapi import APIRouter
+from fastapi import APIRouter, BackgroundTasks, Query
 from typing import List, Optional
 
-from app.schemas.files import FileMetadata, FileInfoResponse, FileListResponse, ProcessFilesResponse
+from app.schemas.files import FileMetadata, FileInfoResponse, FileListResponse, ProcessFilesQueuedResponse
 from app.services.file_management_service import FileManagementService
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Set from the request until its background run finishes, so repeated POSTs
+# do not start overlapping runs over the same unprocessed files.
+_process_files_running = False
+
 @router.post("/register-files", response_model=List[FileInfoResponse])
 async def register_files(files_metadata: List[FileMetadata]):
    
-    return FileManagementService.register_files(files_metadata)
+    return await FileManagementService.register_files(files_metadata)
   
 @router.get("/pdf-files", response_model=List[FileListResponse])
-async def list_pdf_files(user_id: Optional[str] = None):
-        return FileManagementService.list_pdf_files(user_id)
+async def list_pdf_files(
+    user_id: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1)
+):
+        return await FileManagementService.list_pdf_files(user_id, skip=skip, limit=limit)
 
 
 @router.delete("/pdf-files/{file_id}", response_model=bool)
 async def delete_pdf_file(file_id: str):
-        return FileManagementService.delete_pdf_file(file_id)
-@router.post("/process-files", response_model=ProcessFilesResponse)
-async def process_files():
-    return await FileManagementService.process_unprocessed_files()
+        return await FileManagementService.delete_pdf_file(file_id)
+@router.post("/process-files", response_model=ProcessFilesQueuedResponse, status_code=202)
+async def process_files(background_tasks: BackgroundTasks):
+    global _process_files_running
+    if _process_files_running:
+        return ProcessFilesQueuedResponse(status="running")
+    _process_files_running = True
+    background_tasks.add_task(_run_process_files)
+    return ProcessFilesQueuedResponse(status="queued")
+
+
+async def _run_process_files() -> None:
+    global _process_files_running
+    try:
+        await FileManagementService.process_unprocessed_files()
+    finally:
+        _process_files_running = False
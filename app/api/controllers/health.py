@@ -1,4 +1,5 @@
 import os
+import time
 import logging
 import datetime
 from fastapi import APIRouter
@@ -10,6 +11,10 @@ from app.core.config import settings
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+FAISS_INDEX_PATH = os.path.join(settings.FAISS_INDEX_DIR, "index.faiss")
+FAISS_STATS_TTL_SECONDS = 1.0
+_faiss_stats_cache: dict = {"expires_at": 0.0, "stats": None}
+
 
 class HealthResponse(BaseModel):
     status: str  # "healthy" or "unhealthy"
@@ -33,6 +38,26 @@ class FAISSStatusResponse(BaseModel):
     last_modified: Optional[str] = None
 
 
+def _faiss_stats() -> dict:
+    """Stat the FAISS index file at most once per TTL window."""
+    now = time.monotonic()
+    if _faiss_stats_cache["stats"] is not None and now < _faiss_stats_cache["expires_at"]:
+        return _faiss_stats_cache["stats"]
+    
+    stats = {"index_exists": False, "index_path": FAISS_INDEX_PATH}
+    try:
+        stat_result = os.stat(FAISS_INDEX_PATH)
+        stats["index_exists"] = True
+        stats["index_size_mb"] = round(stat_result.st_size / (1024 * 1024), 2)
+        stats["last_modified"] = datetime.datetime.fromtimestamp(stat_result.st_mtime).isoformat()
+    except FileNotFoundError:
+        pass
+    
+    _faiss_stats_cache["stats"] = stats
+    _faiss_stats_cache["expires_at"] = now + FAISS_STATS_TTL_SECONDS
+    return stats
+
+
 @router.get("/", response_model=HealthResponse)
 async def health_check():
     try:
@@ -42,18 +67,7 @@ async def health_check():
             "stream_key": consumer.stream_key,
             "consumer_group": consumer.consumer_group
         }
-        index_path = os.path.join(settings.FAISS_INDEX_DIR, "index.faiss")
-        faiss_status = {
-            "index_exists": os.path.exists(index_path),
-            "index_path": index_path
-        }
-        
-        if faiss_status["index_exists"]:
-            file_size = os.path.getsize(index_path)
-            faiss_status["index_size_mb"] = round(file_size / (1024 * 1024), 2)
-            
-            mod_time = os.path.getmtime(index_path)
-            faiss_status["last_modified"] = datetime.datetime.fromtimestamp(mod_time).isoformat()
+        faiss_status = dict(_faiss_stats())
         
         overall_status = "healthy" if consumer.is_connected and faiss_status["index_exists"] else "degraded"
         
@@ -82,18 +96,4 @@ async def redis_status():
 
 @router.get("/faiss", response_model=FAISSStatusResponse)
 async def faiss_status():
-    index_path = os.path.join(settings.FAISS_INDEX_DIR, "index.faiss")
-    
-    response = FAISSStatusResponse(
-        index_exists=os.path.exists(index_path),
-        index_path=index_path
-    )
-    
-    if response.index_exists:
-        file_size = os.path.getsize(index_path)
-        response.index_size_mb = round(file_size / (1024 * 1024), 2)
-        
-        mod_time = os.path.getmtime(index_path)
-        response.last_modified = datetime.datetime.fromtimestamp(mod_time).isoformat()
-    
-    return response
+    return FAISSStatusResponse(**_faiss_stats())
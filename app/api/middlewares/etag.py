@@ -0,0 +1,63 @@
+from typing import Optional
+from blake3 import blake3
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+def _etag_matches(etag: str, if_none_match: str) -> bool:
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+class ETagMiddleware:
+    """Tag JSON GET responses and answer a matching If-None-Match with 304.
+
+    Pure ASGI: other methods, including the SSE streams and POST /evaluate,
+    go straight to the app, and only 200 JSON bodies are buffered.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start: Optional[Message] = None
+        body_parts: list[bytes] = []
+
+        async def send_with_etag(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                content_type = Headers(raw=message["headers"]).get("content-type", "")
+                if message["status"] == 200 and content_type.startswith("application/json"):
+                    start = message
+                    return
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body_parts.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(body_parts)
+            headers = MutableHeaders(raw=list(start["headers"]))
+            headers["ETag"] = f'"{blake3(body).hexdigest(length=16)}"'
+            if if_none_match and _etag_matches(headers["ETag"], if_none_match):
+                # Keeps CORS, Cache-Control and Vary from the full response
+                del headers["content-length"]
+                await send({"type": "http.response.start", "status": 304, "headers": headers.raw})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            await send({**start, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_with_etag)
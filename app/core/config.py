@@ -1,21 +1,80 @@
+import os
+import time
 from pydantic_settings import BaseSettings
-from datetime import datetime
+
+# (epoch second, formatted string) of the last now_string() call.
+_now_string_cache: list = [0, ""]
 
 
 class Settings(BaseSettings):
     MONGODB_URI: str
     DB_NAME: str = "pdf_chatbot"
     COLLECTION_NAME: str = "pdf_files"
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MIN_POOL_SIZE: int = 10
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = 5000
     API_KEY: str | None = None
     MODEL_NAME: str = "Google AI"
     DATA_DIR: str = "data"
     FAISS_INDEX_DIR: str = "data/faiss_index"
+    FAISS_SEARCH_BATCH_SIZE: int = 32
+    FAISS_SEARCH_BATCH_WINDOW_MS: float = 5.0
+    FAISS_VECTOR_STORAGE: str = "fp16"  # "fp16" or "fp32"
+    FAISS_DOCSTORE_LOG_MAX_BYTES: int = 64 * 1024 * 1024
+    FAISS_HNSW_MIN_VECTORS: int = 20000
+    FAISS_HNSW_M: int = 32
+    FAISS_HNSW_EF_CONSTRUCTION: int = 80
+    FAISS_HNSW_EF_SEARCH: int = 64
+    EVALUATE_EF_SEARCH: int = 100
+    LEARNING_PATH_EF_SEARCH: int = 40
+    # Retrieval returns 5 chunks of up to 10000 chars with the default
+    # "Google AI" splitter, so the budget fits them whole; set the per-doc
+    # cap only when using smaller chunks or a smaller context window.
+    MAX_CONTEXT_CHARS_PER_DOC: int | None = None
+    MAX_CONTEXT_CHARS: int = 50000
+    EMBEDDING_BATCH_SIZE: int = 100
+    EMBEDDING_MAX_BATCH_TOKENS: int = 20000
+    EMBEDDING_MAX_CONCURRENCY: int = 8
+    EMBEDDING_CACHE_SIZE: int = 8192
+    RETRY_MAX_ATTEMPTS: int = 6
+    RETRY_MAX_WAIT_SECONDS: float = 30.0
+    # Directory for a persistent chunk-embedding cache; unset disables it
+    EMBEDDING_CACHE_DIR: str | None = None
+    # Serve embeddings from a Text Embeddings Inference server instead of
+    # Google. Switching providers changes the vector space, so the FAISS
+    # index must be rebuilt.
+    TEI_URL: str | None = None
+    TEI_BATCH_SIZE: int = 32
+    RESPONSE_CACHE_SIZE: int = 1024
+    RESPONSE_CACHE_TTL_SECONDS: int = 3600
+    ENABLE_FREE_CHAT_CACHE: bool = False
+    FREE_CHAT_CACHE_TTL_SECONDS: int = 300
+    SEMANTIC_CACHE_SIZE: int = 512
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95
+    # Near-duplicate matches can hand one question another's graded answer
+    ENABLE_SEMANTIC_EVALUATE_CACHE: bool = False
+    LLM_BATCH_ENABLED: bool = False
+    LLM_BATCH_SIZE: int = 8
+    LLM_BATCH_WINDOW_MS: float = 25.0
     
     # Redis Stream configuration
     REDIS_URL: str | None = None
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_PASSWORD: str | None = None
+    REDIS_MAX_CONNECTIONS: int = 20
+    STREAM_BLOCK_MS: int = 30000
+    COURSE_EVENT_BATCH_SIZE: int = 128
+    COURSE_EVENT_COALESCE_MS: int = 500
+    COURSE_EVENT_CONCURRENCY: int = 8
+    FILE_EVENT_BATCH_SIZE: int = 256
+    FILE_EVENT_CONCURRENCY: int = 4
+    INGEST_BATCH_SIZE: int = 16
+    INGEST_BATCH_WINDOW_MS: float = 50.0
+    PDF_EXTRACT_WORKERS: int = min(4, os.cpu_count() or 1)
+    PDF_DOWNLOAD_CONCURRENCY: int = 8
+    HTTP_MAX_CONNECTIONS: int = 32
+    HTTP_MAX_CONNECTIONS_PER_HOST: int = 20
 
     class Config:
         env_file = ".env"
@@ -23,7 +82,12 @@ class Settings(BaseSettings):
 
     @staticmethod
     def now_string() -> str:
-        return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # Resolution is one second, so format at most once per second.
+        now = int(time.time())
+        if now != _now_string_cache[0]:
+            _now_string_cache[0] = now
+            _now_string_cache[1] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now))
+        return _now_string_cache[1]
 
 
 settings = Settings()
@@ -1,4 +1,6 @@
 import logging
+from dataclasses import dataclass
+from functools import lru_cache
 from app.repositories.faiss_embedding_repository import FAISSEmbeddingRepository
 from app.services.embedding_service import EmbeddingService
 from app.services.chat_service import ChatService
@@ -6,72 +8,80 @@ from app.services.providers.google_ai_provider import GoogleAIModelProvider
 from app.services.prompt_builder import PromptBuilder
 from app.services.response_parser import ResponseParser
 from app.services.context_builder import ContextBuilder
+from app.services.semantic_cache import SemanticResponseCache
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True, slots=True)
 class Container:
-   
-    _instance = None
-    _repositories = {}
-    _services = {}
-    _providers = {}
-    _builders = {}
-    
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance._initialize()
-        return cls._instance
-    
-    def _initialize(self):
-        logger.info("Initializing dependency injection container")
-        
-        self._repositories['embedding'] = FAISSEmbeddingRepository()
-        
-        self._providers['google_ai'] = GoogleAIModelProvider(
-            api_key=settings.API_KEY,
-            model_name="gemini-2.5-flash-lite"
-        )
-        
-        self._builders['prompt'] = PromptBuilder()
-        self._builders['context'] = ContextBuilder()
-        self._builders['response'] = ResponseParser()
-        
-        self._services['embedding'] = EmbeddingService(
-            self._repositories['embedding']
-        )
-        self._services['chat'] = ChatService(
-            repository=self._repositories['embedding'],
-            ai_provider=self._providers['google_ai'],
-            prompt_builder=self._builders['prompt'],
-            response_parser=self._builders['response'],
-            context_builder=self._builders['context']
-        )
-        
-        logger.info("Dependency injection container initialized")
+    embedding_repository: FAISSEmbeddingRepository
+    ai_provider: GoogleAIModelProvider
+    prompt_builder: PromptBuilder
+    context_builder: ContextBuilder
+    response_parser: ResponseParser
+    embedding_service: EmbeddingService
+    chat_service: ChatService
     
     def get_embedding_repository(self) -> FAISSEmbeddingRepository:
-        return self._repositories['embedding']
+        return self.embedding_repository
     
     def get_embedding_service(self) -> EmbeddingService:
-        return self._services['embedding']
+        return self.embedding_service
     
     def get_chat_service(self) -> ChatService:
-        return self._services['chat']
+        return self.chat_service
     
     def get_ai_provider(self) -> GoogleAIModelProvider:
-        return self._providers['google_ai']
+        return self.ai_provider
     
     def get_prompt_builder(self) -> PromptBuilder:
-        return self._builders['prompt']
+        return self.prompt_builder
     
     def get_context_builder(self) -> ContextBuilder:
-        return self._builders['context']
+        return self.context_builder
     
     def get_response_parser(self) -> ResponseParser:
-        return self._builders['response']
+        return self.response_parser
 
 
-container = Container()
+@lru_cache(maxsize=1)
+def build_container() -> Container:
+    logger.info("Initializing dependency injection container")
+    
+    repository = FAISSEmbeddingRepository()
+    ai_provider = GoogleAIModelProvider(
+        api_key=settings.API_KEY,
+        model_name="gemini-2.5-flash-lite"
+    )
+    prompt_builder = PromptBuilder()
+    context_builder = ContextBuilder()
+    response_parser = ResponseParser()
+    chat_service = ChatService(
+        repository=repository,
+        ai_provider=ai_provider,
+        prompt_builder=prompt_builder,
+        response_parser=response_parser,
+        context_builder=context_builder,
+        semantic_cache=SemanticResponseCache(
+            maxsize=settings.SEMANTIC_CACHE_SIZE,
+            threshold=settings.SEMANTIC_CACHE_THRESHOLD
+        ) if settings.SEMANTIC_CACHE_SIZE > 0 else None
+    )
+    
+    container = Container(
+        embedding_repository=repository,
+        ai_provider=ai_provider,
+        prompt_builder=prompt_builder,
+        context_builder=context_builder,
+        response_parser=response_parser,
+        embedding_service=EmbeddingService(
+            repository,
+            on_embeddings_changed=chat_service.cache_clear
+        ),
+        chat_service=chat_service
+    )
+    
+    logger.info("Dependency injection container initialized")
+    return container
@@ -0,0 +1,74 @@
+import asyncio
+from functools import lru_cache
+from langchain_core.embeddings import Embeddings
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from app.core.config import settings
+from app.core.retry import retry_transient
+from app.services.providers.cached_embeddings import CachedEmbeddings
+from app.services.providers.tei_embeddings import TEIEmbeddings
+
+
+@lru_cache(maxsize=4)
+def get_embeddings(api_key: str | None = None) -> Embeddings:
+    # One client per key, shared by the repository and the PDF pipeline so
+    # they reuse the same HTTP connections.
+    if settings.TEI_URL:
+        embeddings = TEIEmbeddings(settings.TEI_URL, batch_size=settings.TEI_BATCH_SIZE)
+        namespace = settings.TEI_URL
+    else:
+        embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=api_key)
+        namespace = "models/embedding-001"
+    if settings.EMBEDDING_CACHE_DIR:
+        # Only this optional cache needs the top-level langchain package
+        from langchain.embeddings import CacheBackedEmbeddings
+        from langchain.storage import LocalFileStore
+        
+        # Survives restarts, so re-ingesting unchanged chunks costs no API
+        # calls; the namespace keeps vectors from different models apart.
+        embeddings = CacheBackedEmbeddings.from_bytes_store(
+            embeddings,
+            LocalFileStore(settings.EMBEDDING_CACHE_DIR),
+            namespace=namespace
+        )
+    if settings.EMBEDDING_CACHE_SIZE > 0:
+        embeddings = CachedEmbeddings(embeddings, settings.EMBEDDING_CACHE_SIZE)
+    return embeddings
+
+
+def _approx_tokens(text: str) -> int:
+    # ~4 characters per token for English text; only used to size requests
+    return len(text) // 4 + 1
+
+
+def pack_batches(texts: list[str], batch_size: int, max_tokens: int) -> list[list[str]]:
+    """Greedily split ``texts`` into batches of at most ``batch_size`` items
+    and roughly ``max_tokens`` tokens, so large chunks do not overflow a
+    single embedding request. A text larger than ``max_tokens`` gets a batch
+    of its own."""
+    batches: list[list[str]] = []
+    batch: list[str] = []
+    batch_tokens = 0
+    for text in texts:
+        tokens = _approx_tokens(text)
+        if batch and (len(batch) >= batch_size or batch_tokens + tokens > max_tokens):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(text)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+async def embed_documents_concurrently(embeddings: Embeddings, texts: list[str]) -> list[list[float]]:
+    # Fan the batches out concurrently; gather keeps them in input order.
+    semaphore = asyncio.Semaphore(settings.EMBEDDING_MAX_CONCURRENCY)
+    
+    @retry_transient
+    async def embed_batch(batch: list[str]) -> list[list[float]]:
+        async with semaphore:
+            return await asyncio.to_thread(embeddings.embed_documents, batch)
+    
+    batches = pack_batches(texts, settings.EMBEDDING_BATCH_SIZE, settings.EMBEDDING_MAX_BATCH_TOKENS)
+    results = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+    return [vector for batch_vectors in results for vector in batch_vectors]
@@ -0,0 +1,33 @@
+import hashlib
+from functools import lru_cache
+from blake3 import blake3
+
+URL_HASH_ALGO = "blake3"
+LEGACY_URL_HASH_ALGO = "sha256"
+
+
+@lru_cache(maxsize=4096)
+def generate_url_hash(url: str) -> str:
+    # Dedup key only, no cryptographic requirement; BLAKE3 is SIMD-accelerated.
+    return blake3(url.encode()).hexdigest(length=32)
+
+
+def generate_text_hash(text: str) -> str:
+    # Change detection for re-ingested course text.
+    return blake3(text.encode()).hexdigest(length=32)
+
+
+def generate_chunk_digest(text: str) -> bytes:
+    # In-process cache key; raw bytes hash faster than a hex string.
+    return blake3(text.encode()).digest()
+
+
+def new_content_hasher() -> blake3:
+    # Incremental hash of downloaded file bytes, fed chunk by chunk.
+    return blake3()
+
+
+@lru_cache(maxsize=4096)
+def legacy_url_hash(url: str) -> str:
+    # Documents registered before the BLAKE3 switch are keyed by SHA-256.
+    return hashlib.sha256(url.encode()).hexdigest()
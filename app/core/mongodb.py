@@ -1,14 +1,44 @@
-from pymongo import MongoClient
+import logging
+from functools import lru_cache
+from pymongo import AsyncMongoClient
+from pymongo.errors import DuplicateKeyError
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
 
-try:
-    client = MongoClient(
+
+@lru_cache(maxsize=1)
+def get_client() -> AsyncMongoClient:
+    return AsyncMongoClient(
         settings.MONGODB_URI,
         tls=True,
         tlsAllowInvalidCertificates=True,
+        maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+        minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
     )
-    client.admin.command('ping')
-    db = client[settings.DB_NAME]
-except Exception as e:
-    raise
+
+
+async def connect_mongodb() -> None:
+    await get_client().admin.command('ping')
+    await ensure_indexes()
+
+
+async def ensure_indexes() -> None:
+    try:
+        await db.processed_files.create_index("url_hash", unique=True)
+    except DuplicateKeyError as e:
+        # Deployments that predate the index can hold duplicate rows from
+        # overlapping runs; serve without the constraint until they are removed.
+        logger.warning("processed_files has duplicate url_hash rows, unique index not created: %s", e)
+    await db.processed_files.create_index("content_hash", sparse=True)
+    await db.files.create_index("url_hash")
+    await db.files.create_index("file_id")
+    await db.files.create_index([("user_id", 1), ("embedding_created", 1)])
+
+
+async def close_mongodb() -> None:
+    await get_client().close()
+
+
+db = get_client()[settings.DB_NAME]
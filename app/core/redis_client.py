@@ -0,0 +1,43 @@
+from functools import lru_cache
+from typing import Optional
+from redis.asyncio import ConnectionPool, Redis
+from app.core.config import settings
+
+
+@lru_cache(maxsize=1)
+def get_redis_pool() -> ConnectionPool:
+    if settings.REDIS_URL:
+        return ConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            decode_responses=False,
+            socket_connect_timeout=5,
+            socket_keepalive=True,
+        )
+    return ConnectionPool(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        password=settings.REDIS_PASSWORD,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        decode_responses=False,
+        socket_connect_timeout=5,
+        socket_keepalive=True,
+        socket_keepalive_options={
+            1: (9, 3, 3),
+        }
+    )
+
+
+def get_redis() -> Redis:
+    # Clients share the pool; closing a client leaves the pool open.
+    return Redis(connection_pool=get_redis_pool())
+
+
+def decode_field(value: Optional[bytes]) -> Optional[str]:
+    # The pool returns raw bytes; stream consumers decode only the fields
+    # they read.
+    return value.decode() if value is not None else None
+
+
+async def close_redis_pool() -> None:
+    await get_redis_pool().disconnect()
@@ -0,0 +1,71 @@
+import asyncio
+from typing import Optional
+import aiohttp
+import httpx
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
+from tenacity.wait import wait_base
+from app.core.config import settings
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code
+    # google.api_core exceptions carry the HTTP status as ``code``
+    code = getattr(exc, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """Rate limits, server errors and dropped connections; 4xx are final."""
+    # Provider clients often re-raise their own error type from the HTTP one
+    while exc is not None:
+        if isinstance(exc, (asyncio.TimeoutError, aiohttp.ClientConnectionError, httpx.TransportError)):
+            return True
+        status = _status_code(exc)
+        if status is not None:
+            return status == 429 or status >= 500
+        exc = exc.__cause__
+    return False
+
+
+def _retry_after_seconds(exc: BaseException) -> Optional[float]:
+    if isinstance(exc, aiohttp.ClientResponseError):
+        headers = exc.headers or {}
+    elif isinstance(exc, httpx.HTTPStatusError):
+        headers = exc.response.headers
+    else:
+        return None
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class wait_retry_after(wait_base):
+    """Honour a 429's Retry-After header, else fall back to ``fallback``."""
+
+    def __init__(self, fallback: wait_base, max_wait: float):
+        self.fallback = fallback
+        self.max_wait = max_wait
+
+    def __call__(self, retry_state) -> float:
+        exc = retry_state.outcome.exception() if retry_state.outcome else None
+        retry_after = _retry_after_seconds(exc) if exc else None
+        if retry_after is not None:
+            return min(retry_after, self.max_wait)
+        return self.fallback(retry_state)
+
+
+# Works on both sync and async functions; the last error is re-raised once
+# the attempts run out.
+retry_transient = retry(
+    retry=retry_if_exception(is_transient_error),
+    wait=wait_retry_after(
+        wait_random_exponential(min=1, max=settings.RETRY_MAX_WAIT_SECONDS),
+        settings.RETRY_MAX_WAIT_SECONDS
+    ),
+    stop=stop_after_attempt(settings.RETRY_MAX_ATTEMPTS),
+    reraise=True
+)
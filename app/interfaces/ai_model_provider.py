@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import AsyncIterator, Optional
 
 
 class IAIModelProvider(ABC):
@@ -9,11 +9,23 @@ class IAIModelProvider(ABC):
         self,
         prompt: str,
         temperature: float = 0.3,
-        variables: Optional[dict] = None
+        variables: Optional[dict] = None,
+        json_mode: bool = False,
+        response_schema: Optional[dict] = None
     ) -> str:
        
         pass
     
+    @abstractmethod
+    def stream_response(
+        self,
+        prompt: str,
+        temperature: float = 0.3,
+        variables: Optional[dict] = None
+    ) -> AsyncIterator[str]:
+       
+        pass
+    
     @abstractmethod
     def validate_configuration(self) -> bool:
        
@@ -16,15 +16,45 @@ class IEmbeddingRepository(ABC):
         pass
     
     @abstractmethod
-    async def search_similar(self, query: str, k: int = 5) -> list[object]:
+    async def search_similar(
+        self,
+        query: str,
+        k: int = 5,
+        ef_search: Optional[int] = None
+    ) -> list[object]:
         """Search for similar documents."""
         pass
     
+    @abstractmethod
+    async def embed_query(self, query: str) -> list[float]:
+        """Embed a query with the store's embedding model."""
+        pass
+    
+    @abstractmethod
+    async def search_by_vector(
+        self,
+        query_vector: list[float],
+        k: int = 5,
+        ef_search: Optional[int] = None
+    ) -> list[object]:
+        """Search for similar documents using an already embedded query."""
+        pass
+    
     @abstractmethod
     async def delete_embeddings(self, course_id: int) -> bool:
         """Delete embeddings for a course."""
         pass
     
+    @abstractmethod
+    async def get_course_metadata(self, course_id: int) -> Optional[dict]:
+        """Return the stored metadata of a course's first chunk, if any."""
+        pass
+    
+    @abstractmethod
+    def index_version(self) -> Optional[int]:
+        """Token that changes whenever the stored index is written; None if there is none."""
+        pass
+    
     @abstractmethod
     async def exists(self) -> bool:
         """Check if embeddings exist."""
@@ -17,6 +17,11 @@ class IPromptBuilder(ABC):
         
         pass
     
+    @abstractmethod
+    def build_batch_rag_prompt(self, context: str, questions: list[str]) -> tuple[str, dict]:
+        
+        pass
+    
     @abstractmethod
     def build_free_chat_prompt(self, message: str) -> tuple[str, dict]:
        
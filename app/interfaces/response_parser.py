@@ -11,6 +11,10 @@ class IResponseParser(ABC):
     def parse_json_response(self, response: str) -> dict:
         pass
     
+    @abstractmethod
+    def parse_batch_answers(self, response: str, expected: int) -> list[str]:
+        pass
+    
     @abstractmethod
     def parse_learning_path_response(self, response: str) -> dict:
         pass
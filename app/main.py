@@ -1,43 +1,68 @@
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from app.api.routers.routers import api_router
+from app.api.middlewares.etag import ETagMiddleware
+from app.core.container import build_container
+from app.core.mongodb import connect_mongodb, close_mongodb
+from app.core.redis_client import close_redis_pool
 from app.services.course_event_consumer import start_consumer, stop_consumer
 from app.services.file_event_consumer import start_file_consumer, stop_file_consumer
+from app.services.pdf import close_http_session, shutdown_pdf_pool
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Ai Service")
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-app.include_router(api_router, prefix="/ai")
-
-@app.on_event("startup")
-async def startup_event():
-    """Initialize Redis Stream consumers on startup."""
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the container, warm shared resources and run Redis Stream consumers."""
     try:
-        await start_consumer()
+        await connect_mongodb()
+        
+        container = build_container()
+        app.state.container = container
+        # Load the FAISS index before traffic arrives so the first chat is warm
+        await container.get_embedding_repository().warm_up()
+        
+        await start_consumer(container.get_embedding_service())
         await start_file_consumer()
         logger.info("Application startup completed")
     except Exception as e:
         
         logger.error(f"Failed to start application: {e}")
         raise
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Gracefully shutdown Redis Stream consumers."""
+    
+    yield
+    
     try:
         await stop_consumer()
         await stop_file_consumer()
+        await close_redis_pool()
+        await close_mongodb()
+        shutdown_pdf_pool()
+        await close_http_session()
         logger.info("Application shutdown completed")
     except Exception as e:
         logger.error(f"Error during shutdown: {e}")
+
+
+app = FastAPI(
+    title="Ai Service",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+# Added last so it wraps CORS and its 304s keep the CORS headers
+app.add_middleware(ETagMiddleware)
+
+app.include_router(api_router, prefix="/ai")
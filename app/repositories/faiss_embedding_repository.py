@@ -1,25 +1,120 @@
+import asyncio
 import logging
 import os
+import threading
+import time
+import uuid
 from typing import Optional
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+import faiss
+import numpy as np
+import orjson
+from langchain_core.embeddings import Embeddings
 from langchain_community.vectorstores import FAISS
 from app.core.config import settings
+from app.core.embeddings import embed_documents_concurrently, get_embeddings
 from app.interfaces.embedding_repository import IEmbeddingRepository
+from app.services.faiss_index import (
+    COSINE_STORE_KWARGS,
+    INDEX_WRITE_LOCK,
+    INDEX_FILE,
+    is_cosine_index,
+    maybe_upgrade_index,
+    persist_vector_store,
+    read_vector_store,
+    remove_documents,
+    remove_index_files,
+    search_params,
+    write_file_atomic,
+)
 
 logger = logging.getLogger(__name__)
 
 
 class FAISSEmbeddingRepository(IEmbeddingRepository):
     
-    def __init__(self):
+    def __init__(self, embeddings: Optional[Embeddings] = None):
         self.index_dir = settings.FAISS_INDEX_DIR
+        self.index_path = os.path.join(self.index_dir, INDEX_FILE)
+        self.course_ids_path = os.path.join(self.index_dir, "course_ids.json")
         self.api_key = settings.API_KEY
+        self._embeddings_model = embeddings or get_embeddings(self.api_key)
+        self._vector_store: Optional[FAISS] = None
+        self._index_mtime: Optional[int] = None
+        self._write_lock = asyncio.Lock()
+        # One reload per index version; concurrent searches that see a new
+        # mtime wait for it instead of each deserializing their own copy.
+        self._reload_lock = asyncio.Lock()
+        # Searches run in worker threads; this keeps them off an index that a
+        # write thread is mutating.
+        self._index_lock = threading.Lock()
+        self._search_queue: Optional[asyncio.Queue] = None
+        self._search_batcher: Optional[asyncio.Task] = None
     
     def _get_embeddings_model(self):
-        return GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",
-            google_api_key=self.api_key
-        )
+        return self._embeddings_model
+    
+    def _invalidate_cache(self) -> None:
+        self._vector_store = None
+        self._index_mtime = None
+    
+    def _index_file_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.index_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+    
+    def _cache_written_store(self, vector_store: FAISS) -> None:
+        # The store we just wrote is current, so readers and the next write
+        # reuse it instead of loading the index back from disk.
+        self._vector_store = vector_store
+        self._index_mtime = self._index_file_mtime()
+    
+    def _load_writable_store(self) -> Optional[FAISS]:
+        index_mtime = self._index_file_mtime()
+        if index_mtime is None:
+            return None
+        # The store searches use is a full in-memory copy, so the write path
+        # mutates it directly (under _index_lock) while it is current.
+        if self._vector_store is not None and index_mtime == self._index_mtime:
+            return self._vector_store
+        return read_vector_store(self.index_dir, self._get_embeddings_model())
+    
+    def _load_course_doc_ids(self, vector_store: FAISS) -> dict[str, list[str]]:
+        # The sidecar records the vector count it was written for; if another
+        # writer (the PDF pipeline) changed the index, rebuild it by scanning.
+        ntotal = vector_store.index.ntotal
+        try:
+            with open(self.course_ids_path, "rb") as f:
+                sidecar = orjson.loads(f.read())
+            if sidecar.get("ntotal") == ntotal:
+                return sidecar["courses"]
+        except (FileNotFoundError, orjson.JSONDecodeError, KeyError):
+            pass
+        
+        course_doc_ids: dict[str, list[str]] = {}
+        docstore = vector_store.docstore._dict if hasattr(vector_store.docstore, '_dict') else {}
+        for doc_id, doc in docstore.items():
+            metadata = getattr(doc, 'metadata', {}) or {}
+            course_id = metadata.get('course_id')
+            if course_id is not None:
+                course_doc_ids.setdefault(str(course_id), []).append(doc_id)
+        return course_doc_ids
+    
+    def _sidecar_may_contain(self, course_id: int) -> bool:
+        # Course membership only changes through this repository, which
+        # rewrites the sidecar on every write, so a course missing from it is
+        # not indexed even when a PDF write has made its ntotal stale.
+        try:
+            with open(self.course_ids_path, "rb") as f:
+                return str(course_id) in orjson.loads(f.read())["courses"]
+        except (FileNotFoundError, orjson.JSONDecodeError, KeyError):
+            return True
+    
+    def _save_course_doc_ids(self, vector_store: FAISS, course_doc_ids: dict[str, list[str]]) -> None:
+        write_file_atomic(self.course_ids_path, orjson.dumps({
+            "ntotal": vector_store.index.ntotal,
+            "courses": course_doc_ids
+        }))
     
     async def save_embeddings(self, texts: list[str], metadatas: list[dict]) -> bool:
         try:
@@ -28,124 +123,275 @@ class FAISSEmbeddingRepository(IEmbeddingRepository):
             embeddings = self._get_embeddings_model()
             os.makedirs(self.index_dir, exist_ok=True)
             
-            index_path = os.path.join(self.index_dir, "index.faiss")
+            ids = [str(uuid.uuid4()) for _ in texts]
+            # Embed before touching the index so searches are not held up by
+            # the network round trips.
+            vectors = await embed_documents_concurrently(embeddings, texts)
             
-            if os.path.exists(index_path):
-                try:
-                    vector_store = FAISS.load_local(
-                        self.index_dir,
-                        embeddings,
-                        allow_dangerous_deserialization=True
-                    )
-                    vector_store.add_texts(texts, metadatas=metadatas)
-                    vector_store.save_local(self.index_dir)
-                    logger.info(f"Updated existing FAISS index with {len(texts)} texts")
-                except Exception as e:
-                    logger.warning(f"Error updating index, creating new: {e}")
-                    vector_store = FAISS.from_texts(texts, embedding=embeddings, metadatas=metadatas)
-                    vector_store.save_local(self.index_dir)
-                    logger.info(f"Created new FAISS index with {len(texts)} texts")
-            else:
-                vector_store = FAISS.from_texts(texts, embedding=embeddings, metadatas=metadatas)
-                vector_store.save_local(self.index_dir)
-                logger.info(f"Created new FAISS index with {len(texts)} texts")
+            async with self._write_lock:
+                vector_store = await asyncio.to_thread(
+                    self._write_embeddings, texts, vectors, metadatas, ids
+                )
+                self._cache_written_store(vector_store)
             
             return True
         except Exception as e:
             logger.error(f"Error saving embeddings: {e}", exc_info=True)
             return False
     
+    def _write_embeddings(
+        self, texts: list[str], vectors: list[list[float]], metadatas: list[dict], ids: list[str]
+    ) -> FAISS:
+        text_embeddings = list(zip(texts, vectors))
+        course_doc_ids: dict[str, list[str]] = {}
+        
+        # INDEX_WRITE_LOCK orders this against the PDF pipeline's writes;
+        # _index_lock keeps this process's searches off the mutating store.
+        with INDEX_WRITE_LOCK, self._index_lock:
+            vector_store = self._load_writable_store()
+            if vector_store is not None:
+                try:
+                    course_doc_ids = self._load_course_doc_ids(vector_store)
+                    vector_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+                    maybe_upgrade_index(vector_store)
+                    persist_vector_store(vector_store, self.index_dir, new_doc_ids=ids)
+                    logger.info(f"Updated existing FAISS index with {len(texts)} texts")
+                except Exception:
+                    # A fresh index would drop every other course and file;
+                    # the in-memory store may be half-updated, so reload it.
+                    self._invalidate_cache()
+                    raise
+            else:
+                vector_store = FAISS.from_embeddings(
+                    text_embeddings, self._get_embeddings_model(),
+                    metadatas=metadatas, ids=ids, **COSINE_STORE_KWARGS
+                )
+                maybe_upgrade_index(vector_store)
+                persist_vector_store(vector_store, self.index_dir)
+                logger.info(f"Created new FAISS index with {len(texts)} texts")
+            
+            for doc_id, metadata in zip(ids, metadatas):
+                course_doc_ids.setdefault(str(metadata.get('course_id')), []).append(doc_id)
+            self._save_course_doc_ids(vector_store, course_doc_ids)
+        
+        return vector_store
+    
     async def load_embeddings(self) -> Optional[object]:
         try:
-            embeddings = self._get_embeddings_model()
-            index_path = os.path.join(self.index_dir, "index.faiss")
-            
-            if not os.path.exists(index_path):
+            index_mtime = self._index_file_mtime()
+            if index_mtime is None:
                 logger.warning("FAISS index not found")
+                self._invalidate_cache()
                 return None
             
-            vector_store = FAISS.load_local(
-                self.index_dir,
-                embeddings,
-                allow_dangerous_deserialization=True
-            )
-            logger.info("Loaded FAISS index successfully")
-            return vector_store
+            # The mtime check also catches writes from the PDF pipeline
+            if self._vector_store is not None and index_mtime == self._index_mtime:
+                return self._vector_store
+            
+            async with self._reload_lock:
+                # Another caller may have loaded this version while we waited
+                index_mtime = self._index_file_mtime()
+                if index_mtime is None:
+                    self._invalidate_cache()
+                    return None
+                if self._vector_store is not None and index_mtime == self._index_mtime:
+                    return self._vector_store
+                
+                embeddings = self._get_embeddings_model()
+                vector_store = await asyncio.to_thread(read_vector_store, self.index_dir, embeddings)
+                self._vector_store = vector_store
+                self._index_mtime = index_mtime
+                logger.info("Loaded FAISS index successfully")
+                return vector_store
         except Exception as e:
             logger.error(f"Error loading embeddings: {e}", exc_info=True)
             return None
     
-    async def search_similar(self, query: str, k: int = 5) -> list[object]:
+    async def warm_up(self) -> None:
+        started = time.perf_counter()
+        vector_store = await self.load_embeddings()
+        size = vector_store.index.ntotal if vector_store else 0
+        logger.info(f"Warmed FAISS index ({size} vectors) in {time.perf_counter() - started:.3f}s")
+    
+    async def search_similar(
+        self,
+        query: str,
+        k: int = 5,
+        ef_search: Optional[int] = None
+    ) -> list[object]:
+        try:
+            if not await self.exists():
+                logger.warning("No vector store available for search")
+                return []
+            query_vector = await self.embed_query(query)
+        except Exception:
+            logger.exception("Error searching embeddings")
+            return []
+        return await self.search_by_vector(query_vector, k, ef_search)
+    
+    async def embed_query(self, query: str) -> list[float]:
+        return await self._get_embeddings_model().aembed_query(query)
+    
+    async def search_by_vector(
+        self,
+        query_vector: list[float],
+        k: int = 5,
+        ef_search: Optional[int] = None
+    ) -> list[object]:
         try:
             vector_store = await self.load_embeddings()
             if not vector_store:
                 logger.warning("No vector store available for search")
                 return []
             
-            docs = vector_store.similarity_search(query, k=k)
-            logger.info(f"Found {len(docs)} similar documents for query")
+            if self._search_batcher is None or self._search_batcher.done():
+                self._search_queue = asyncio.Queue()
+                self._search_batcher = asyncio.create_task(self._run_search_batcher())
+            
+            future = asyncio.get_running_loop().create_future()
+            await self._search_queue.put((vector_store, query_vector, k, ef_search, future))
+            docs = await future
+            logger.debug("Found %d similar documents for query", len(docs))
             return docs
-        except Exception as e:
-            logger.error(f"Error searching embeddings: {e}", exc_info=True)
+        except Exception:
+            logger.exception("Error searching embeddings")
             return []
     
+    async def _run_search_batcher(self) -> None:
+        # Coalesce queries that arrive within a short window into a single
+        # index.search call over a stacked query matrix.
+        window = settings.FAISS_SEARCH_BATCH_WINDOW_MS / 1000
+        while True:
+            batch = [await self._search_queue.get()]
+            deadline = asyncio.get_running_loop().time() + window
+            while len(batch) < settings.FAISS_SEARCH_BATCH_SIZE:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._search_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            # A write between enqueue and search may have swapped the store,
+            # and efSearch applies to a whole index.search call
+            groups: dict[tuple, list] = {}
+            for item in batch:
+                groups.setdefault((id(item[0]), item[3]), []).append(item)
+            
+            for items in groups.values():
+                try:
+                    # FAISS drops the GIL inside search, so the loop keeps
+                    # serving requests while the distance kernels run.
+                    results = await asyncio.to_thread(self._search_batch, items[0][0], items)
+                    for (*_, future), docs in zip(items, results):
+                        if not future.done():
+                            future.set_result(docs)
+                except Exception as e:
+                    for *_, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+    
+    def _search_batch(self, vector_store: FAISS, items: list) -> list[list[object]]:
+        query_matrix = np.asarray([item[1] for item in items], dtype=np.float32)
+        max_k = max(item[2] for item in items)
+        
+        results = []
+        with self._index_lock:
+            if is_cosine_index(vector_store.index):
+                faiss.normalize_L2(query_matrix)
+            params = search_params(vector_store.index, items[0][3], max_k)
+            _, indices = vector_store.index.search(query_matrix, max_k, params=params)
+            
+            for row, (_, _, k, _, _) in zip(indices, items):
+                docs = []
+                for i in row[:k]:
+                    if i == -1:
+                        continue
+                    doc = vector_store.docstore.search(vector_store.index_to_docstore_id[i])
+                    if not isinstance(doc, str):
+                        docs.append(doc)
+                results.append(docs)
+        return results
+    
     async def delete_embeddings(self, course_id: int) -> bool:
         try:
             logger.info(f"Deleting embeddings for course {course_id}")
             
-            index_path = os.path.join(self.index_dir, "index.faiss")
-            
-            if not os.path.exists(index_path):
-                logger.warning(f"No FAISS index found")
+            if not self._sidecar_may_contain(course_id):
+                logger.info(f"Course {course_id} is not indexed, nothing to delete")
                 return True
             
-            embeddings = self._get_embeddings_model()
-            vector_store = FAISS.load_local(
-                self.index_dir,
-                embeddings,
-                allow_dangerous_deserialization=True
-            )
-            
-            docstore = vector_store.docstore._dict if hasattr(vector_store.docstore, '_dict') else {}
-            
-            remaining_texts = []
-            remaining_metadatas = []
-            deleted_count = 0
-            
-            for doc_id, doc in docstore.items():
-                metadata = getattr(doc, 'metadata', {}) or {}
-                
-                if str(metadata.get('course_id')) != str(course_id):
-                    remaining_texts.append(doc.page_content if hasattr(doc, 'page_content') else str(doc))
-                    remaining_metadatas.append(metadata)
+            async with self._write_lock:
+                vector_store = await asyncio.to_thread(self._delete_course_vectors, course_id)
+                if vector_store is None:
+                    self._invalidate_cache()
                 else:
-                    deleted_count += 1
+                    self._cache_written_store(vector_store)
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting embeddings: {e}", exc_info=True)
+            return False
+    
+    def _delete_course_vectors(self, course_id: int) -> Optional[FAISS]:
+        # Returns the updated store, or None when no index is left on disk.
+        # Only the in-memory swap takes _index_lock, so searches are not held
+        # up while an HNSW graph is rebuilt; the rest only reads the store.
+        with INDEX_WRITE_LOCK:
+            vector_store = self._load_writable_store()
+            if vector_store is None:
+                logger.warning(f"No FAISS index found")
+                return None
+            
+            course_doc_ids = self._load_course_doc_ids(vector_store)
+            doc_ids = course_doc_ids.pop(str(course_id), [])
+            deleted_count = len(doc_ids)
             
             if deleted_count == 0:
                 logger.warning(f"No embeddings found for course {course_id}")
-                return True
+                return vector_store
             
-            if not remaining_texts:
-                index_path = os.path.join(self.index_dir, "index.faiss")
-                pkl_path = os.path.join(self.index_dir, "index.pkl")
-                
-                if os.path.exists(index_path):
-                    os.remove(index_path)
-                if os.path.exists(pkl_path):
-                    os.remove(pkl_path)
+            if deleted_count >= vector_store.index.ntotal:
+                remove_index_files(self.index_dir)
+                try:
+                    os.remove(self.course_ids_path)
+                except FileNotFoundError:
+                    pass
                 
                 logger.info(f"Cleared FAISS index (deleted {deleted_count} vectors)")
-                return True
-            
-            new_vector_store = FAISS.from_texts(remaining_texts, embedding=embeddings, metadatas=remaining_metadatas)
-            new_vector_store.save_local(self.index_dir)
+                return None
             
-            logger.info(f"Deleted {deleted_count} vectors, rebuilt index with {len(remaining_texts)} remaining")
-            return True
-        except Exception as e:
-            logger.error(f"Error deleting embeddings: {e}", exc_info=True)
-            return False
+            # Removes the vectors from the native index without re-embedding
+            # the documents that remain.
+            remove_documents(vector_store, doc_ids, swap_lock=self._index_lock)
+            persist_vector_store(vector_store, self.index_dir)
+            self._save_course_doc_ids(vector_store, course_doc_ids)
+        
+        logger.info(f"Deleted {deleted_count} vectors, {vector_store.index.ntotal} remaining")
+        return vector_store
+    
+    async def get_course_metadata(self, course_id: int) -> Optional[dict]:
+        try:
+            vector_store = await self.load_embeddings()
+            if not vector_store:
+                return None
+            # A stale sidecar means a full docstore scan; keep it off the loop
+            return await asyncio.to_thread(self._read_course_metadata, vector_store, course_id)
+        except Exception:
+            logger.exception("Error reading metadata for course %s", course_id)
+            return None
+    
+    def index_version(self) -> Optional[int]:
+        # Also moves on writes by the PDF pipeline and other processes
+        return self._index_file_mtime()
+    
+    def _read_course_metadata(self, vector_store: FAISS, course_id: int) -> Optional[dict]:
+        with self._index_lock:
+            doc_ids = self._load_course_doc_ids(vector_store).get(str(course_id))
+            if not doc_ids:
+                return None
+            doc = vector_store.docstore.search(doc_ids[0])
+            return None if isinstance(doc, str) else doc.metadata
     
     async def exists(self) -> bool:
-        index_path = os.path.join(self.index_dir, "index.faiss")
-        return os.path.exists(index_path)
+        return self._index_file_mtime() is not None
@@ -37,4 +37,29 @@ class ChatFreeResponse(BaseModel):
     answer: str
     chat_uid: str
     timestamp: str
-    model_name: str
\ No newline at end of file
+    model_name: str
+
+
+# Gemini response schema mirroring LearningPathResponse; it accepts only an
+# OpenAPI subset, so this is written out rather than taken from
+# model_json_schema() ($defs and titles are rejected).
+LEARNING_PATH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "advice": {"type": "string"},
+        "recommendedLearningPaths": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "course_name": {"type": "string"},
+                    "course_uid": {"type": "string"},
+                    "description": {"type": "string"}
+                },
+                "required": ["course_name", "course_uid", "description"]
+            }
+        },
+        "explanation": {"type": "string"}
+    },
+    "required": ["advice", "recommendedLearningPaths", "explanation"]
+}
@@ -29,4 +29,7 @@ class FileListResponse(BaseModel):
         populate_by_name = True
     
 class ProcessFilesResponse(BaseModel):
-    processed_count: int
\ No newline at end of file
+    processed_count: int
+
+class ProcessFilesQueuedResponse(BaseModel):
+    status: str
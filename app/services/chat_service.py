@@ -1,11 +1,17 @@
+import asyncio
+import hashlib
 import logging
-from typing import Optional
+from typing import AsyncIterator, Optional
+from cachetools import TTLCache
 from fastapi import HTTPException
+from app.core.config import settings
 from app.interfaces.embedding_repository import IEmbeddingRepository
 from app.interfaces.ai_model_provider import IAIModelProvider
 from app.interfaces.prompt_builder import IPromptBuilder
 from app.interfaces.response_parser import IResponseParser
 from app.interfaces.context_builder import IContextBuilder
+from app.schemas.chat import LEARNING_PATH_SCHEMA
+from app.services.semantic_cache import SemanticResponseCache
 
 logger = logging.getLogger(__name__)
 
@@ -18,47 +24,264 @@ class ChatService:
         ai_provider: IAIModelProvider,
         prompt_builder: IPromptBuilder,
         response_parser: IResponseParser,
-        context_builder: IContextBuilder
+        context_builder: IContextBuilder,
+        semantic_cache: Optional[SemanticResponseCache] = None
     ):
         self.repository = repository
         self.ai_provider = ai_provider
         self.prompt_builder = prompt_builder
         self.response_parser = response_parser
         self.context_builder = context_builder
+        self.semantic_cache = semantic_cache
+        self._answer_queue: Optional[asyncio.Queue] = None
+        self._answer_batcher: Optional[asyncio.Task] = None
+        self._answer_tasks: set[asyncio.Task] = set()
+        # Cache key -> answer of an evaluate_question call still running
+        self._inflight: dict[str, asyncio.Future] = {}
+        # Exact-match caches of parsed answers; cleared when course
+        # embeddings change or the index is written by anything else.
+        self._index_version: Optional[int] = None
+        self._answer_cache: TTLCache = TTLCache(
+            maxsize=settings.RESPONSE_CACHE_SIZE,
+            ttl=settings.RESPONSE_CACHE_TTL_SECONDS
+        )
+        self._free_chat_cache: TTLCache = TTLCache(
+            maxsize=settings.RESPONSE_CACHE_SIZE,
+            ttl=settings.FREE_CHAT_CACHE_TTL_SECONDS
+        )
+    
+    @staticmethod
+    def _cache_key(text: str) -> str:
+        return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+    
+    def cache_clear(self) -> None:
+        self._answer_cache.clear()
+        self._free_chat_cache.clear()
+        if self.semantic_cache is not None:
+            self.semantic_cache.clear()
+    
+    def _sync_caches_with_index(self) -> None:
+        # PDF ingests and deletes write the same index without going through
+        # EmbeddingService, so compare its version before serving from cache.
+        version = self.repository.index_version()
+        if version != self._index_version:
+            self.cache_clear()
+            self._index_version = version
+    
+    async def _embed_for_cache(self, text: str) -> Optional[list[float]]:
+        # The vector is reused for retrieval, so a miss costs no extra call
+        if self.semantic_cache is None:
+            return None
+        return await self.repository.embed_query(text)
+    
+    async def _search(
+        self,
+        text: str,
+        query_vector: Optional[list[float]],
+        ef_search: Optional[int]
+    ) -> list[object]:
+        if query_vector is None:
+            return await self.repository.search_similar(text, k=5, ef_search=ef_search)
+        return await self.repository.search_by_vector(query_vector, k=5, ef_search=ef_search)
+    
+    async def _require_index(self) -> None:
+        # Checked before any embedding or LLM call, so a missing index costs
+        # no remote work.
+        if not await self.repository.exists():
+            raise HTTPException(
+                status_code=404,
+                detail="No course embeddings found. Please upload courses first."
+            )
+    
+    async def _retrieve(
+        self,
+        text: str,
+        query_vector: Optional[list[float]],
+        not_found_detail: str,
+        ef_search: Optional[int] = None
+    ) -> list[object]:
+        await self._require_index()
+        docs = await self._search(text, query_vector, ef_search)
+        if not docs:
+            raise HTTPException(status_code=404, detail=not_found_detail)
+        return docs
+    
+    async def _prepare_rag_prompt(
+        self,
+        question: str,
+        query_vector: Optional[list[float]] = None
+    ) -> tuple[str, dict]:
+        docs = await self._retrieve(
+            question,
+            query_vector,
+            "No relevant courses found for this question.",
+            settings.EVALUATE_EF_SEARCH
+        )
+        
+        context = self.context_builder.build_rag_context(docs)
+        
+        return self.prompt_builder.build_rag_prompt(context, question)
     
     async def evaluate_question(self, question: str, question_uid: str) -> str:
         try:
-            if not await self.repository.exists():
-                raise HTTPException(
-                    status_code=404,
-                    detail="No course embeddings found. Please upload courses first."
-                )
+            # The answer depends only on the question text and the index
+            self._sync_caches_with_index()
+            cache_key = self._cache_key(question)
+            cached = self._answer_cache.get(cache_key)
+            if cached is not None:
+                return cached
             
-            docs = await self.repository.search_similar(question, k=5)
-            if not docs:
-                raise HTTPException(
-                    status_code=404,
-                    detail="No relevant courses found for this question."
-                )
+            # Identical questions already in flight share the first caller's
+            # answer; the lookup and insert happen without an await between.
+            inflight = self._inflight.get(cache_key)
+            if inflight is not None:
+                return await asyncio.shield(inflight)
             
-            context = self.context_builder.build_rag_context(docs)
-            
-            prompt_template, variables = self.prompt_builder.build_rag_prompt(
-                context, question
-            )
-            response = await self.ai_provider.generate_response(
-                prompt_template,
-                temperature=0.3,
-                variables=variables
-            )
+            future = asyncio.get_running_loop().create_future()
+            self._inflight[cache_key] = future
+            try:
+                answer = await self._evaluate_uncached(question, cache_key)
+                future.set_result(answer)
+                return answer
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                # Marks the exception retrieved when no one else was waiting
+                future.exception()
+                raise
+            finally:
+                self._inflight.pop(cache_key, None)
             
-            return self.response_parser.parse_text_response(response)
+        except HTTPException:
+            raise
+        except Exception:
+            logger.exception("Error evaluating question")
+            raise
+    
+    async def _evaluate_uncached(self, question: str, cache_key: str) -> str:
+        await self._require_index()
+        # Opt-in: a close paraphrase is not necessarily the same question
+        query_vector = None
+        if settings.ENABLE_SEMANTIC_EVALUATE_CACHE:
+            query_vector = await self._embed_for_cache(question)
+        if query_vector is not None:
+            cached = self.semantic_cache.get(query_vector, key="evaluate")
+            if cached is not None:
+                return cached
+        
+        docs = await self._retrieve(
+            question,
+            query_vector,
+            "No relevant courses found for this question.",
+            settings.EVALUATE_EF_SEARCH
+        )
+        answer = await self._answer(question, docs)
+        self._answer_cache[cache_key] = answer
+        if query_vector is not None:
+            self.semantic_cache.put(query_vector, answer, key="evaluate")
+        return answer
+    
+    async def _answer_single(self, question: str, docs: list[object]) -> str:
+        context = self.context_builder.build_rag_context(docs)
+        prompt_template, variables = self.prompt_builder.build_rag_prompt(context, question)
+        response = await self.ai_provider.generate_response(
+            prompt_template,
+            temperature=0.3,
+            variables=variables
+        )
+        return self.response_parser.parse_text_response(response)
+    
+    async def _answer(self, question: str, docs: list[object]) -> str:
+        if not settings.LLM_BATCH_ENABLED:
+            return await self._answer_single(question, docs)
+        
+        if self._answer_batcher is None or self._answer_batcher.done():
+            self._answer_queue = asyncio.Queue()
+            self._answer_batcher = asyncio.create_task(self._run_answer_batcher())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._answer_queue.put((question, docs, future))
+        return await future
+    
+    async def _run_answer_batcher(self) -> None:
+        # Questions arriving within a short window share one model call
+        window = settings.LLM_BATCH_WINDOW_MS / 1000
+        while True:
+            batch = [await self._answer_queue.get()]
+            deadline = asyncio.get_running_loop().time() + window
+            while len(batch) < settings.LLM_BATCH_SIZE:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._answer_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
             
+            # Answer in the background so the next window opens immediately
+            task = asyncio.create_task(self._answer_batch(batch))
+            self._answer_tasks.add(task)
+            task.add_done_callback(self._answer_tasks.discard)
+    
+    async def _answer_batch(self, batch: list) -> None:
+        answers: Optional[list] = None
+        if len(batch) > 1:
+            try:
+                # Documents retrieved by several questions go in the context once
+                unique_docs = list({
+                    doc.page_content: doc for _, docs, _ in batch for doc in docs
+                }.values())
+                context = self.context_builder.build_rag_context(unique_docs)
+                prompt_template, variables = self.prompt_builder.build_batch_rag_prompt(
+                    context,
+                    [question for question, _, _ in batch]
+                )
+                response = await self.ai_provider.generate_response(
+                    prompt_template,
+                    temperature=0.3,
+                    variables=variables,
+                    json_mode=True
+                )
+                answers = self.response_parser.parse_batch_answers(response, len(batch))
+            except Exception as e:
+                logger.warning("Batched answer failed, answering individually: %s", e)
+        
+        if answers is None:
+            answers = await asyncio.gather(
+                *(self._answer_single(question, docs) for question, docs, _ in batch),
+                return_exceptions=True
+            )
+        
+        for (_, _, future), answer in zip(batch, answers):
+            if future.done():
+                continue
+            if isinstance(answer, BaseException):
+                future.set_exception(answer)
+            else:
+                future.set_result(answer)
+    
+    async def stream_evaluate_question(
+        self,
+        question: str,
+        question_uid: str
+    ) -> AsyncIterator[str]:
+        # Retrieval runs before the stream is returned so 404s are raised
+        # while the HTTP status can still be set.
+        try:
+            prompt_template, variables = await self._prepare_rag_prompt(question)
         except HTTPException:
             raise
-        except Exception as e:
-            logger.error(f"Error evaluating question: {e}", exc_info=True)
+        except Exception:
+            logger.exception("Error preparing streamed question")
             raise
+        
+        return self.ai_provider.stream_response(
+            prompt_template,
+            temperature=0.3,
+            variables=variables
+        )
     
     
     async def get_learning_path(
@@ -68,20 +291,24 @@ class ChatService:
         questions: str
     ) -> dict:
         try:
-            logger.info(f"Generating learning path for topics: {topics}")
+            logger.info("Generating learning path for topics: %s", topics)
             
-            if not await self.repository.exists():
-                raise HTTPException(
-                    status_code=404,
-                    detail="No course embeddings found. Please upload courses first."
-                )
+            # Only the topics are embedded; level and questions must match exactly
+            self._sync_caches_with_index()
+            cache_key = f"learning-path:{level}:{questions}"
+            await self._require_index()
+            query_vector = await self._embed_for_cache(topics)
+            if query_vector is not None:
+                cached = self.semantic_cache.get(query_vector, key=cache_key)
+                if cached is not None:
+                    return cached
             
-            docs = await self.repository.search_similar(topics, k=5)
-            if not docs:
-                raise HTTPException(
-                    status_code=404,
-                    detail="No relevant courses found for these topics."
-                )
+            await self._retrieve(
+                topics,
+                query_vector,
+                "No relevant courses found for these topics.",
+                settings.LEARNING_PATH_EF_SEARCH
+            )
             
             # Build context with course metadata including uid
             # context = self.context_builder.build_context_with_metadata(docs)
@@ -93,25 +320,37 @@ class ChatService:
                 questions
             )
             
-            # Generate response using AI provider
+            # Generate response using AI provider, constrained to the schema
             response = await self.ai_provider.generate_response(
                 prompt_template,
                 temperature=0.3,
-                variables=variables
+                variables=variables,
+                json_mode=True,
+                response_schema=LEARNING_PATH_SCHEMA
             )
             
             # Parse learning path response with fallback handling
-            return self.response_parser.parse_learning_path_response(response)
+            learning_path = self.response_parser.parse_learning_path_response(response)
+            if query_vector is not None:
+                self.semantic_cache.put(query_vector, learning_path, key=cache_key)
+            return learning_path
             
         except HTTPException:
             raise
-        except Exception as e:
-            logger.error(f"Error generating learning path: {e}", exc_info=True)
+        except Exception:
+            logger.exception("Error generating learning path")
             raise
     
     
     async def chat_free(self, message: str) -> str:
         try:
+            # Answers at temperature 0.7 vary, so caching is opt-in
+            cache_key = self._cache_key(message)
+            if settings.ENABLE_FREE_CHAT_CACHE:
+                cached = self._free_chat_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+            
             prompt_template, variables = self.prompt_builder.build_free_chat_prompt(
                 message
             )
@@ -121,9 +360,22 @@ class ChatService:
                 variables=variables
             )
             
-            return self.response_parser.parse_text_response(response)
+            answer = self.response_parser.parse_text_response(response)
+            if settings.ENABLE_FREE_CHAT_CACHE:
+                self._free_chat_cache[cache_key] = answer
+            return answer
             
-        except Exception as e:
-            logger.error(f"Error in free chat: {e}", exc_info=True)
+        except Exception:
+            logger.exception("Error in free chat")
             raise
+    
+    def stream_chat_free(self, message: str) -> AsyncIterator[str]:
+        prompt_template, variables = self.prompt_builder.build_free_chat_prompt(
+            message
+        )
+        return self.ai_provider.stream_response(
+            prompt_template,
+            temperature=0.7,
+            variables=variables
+        )
 
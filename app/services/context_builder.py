@@ -1,8 +1,12 @@
 import logging
+import re
 from app.interfaces.context_builder import IContextBuilder
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
 
 class ContextBuilder(IContextBuilder):
     
@@ -10,16 +14,56 @@ class ContextBuilder(IContextBuilder):
         if not docs:
             return ""
         
-        return "\n\n".join([doc.page_content for doc in docs])
+        return "\n\n".join(self._compact_contents(docs))
+    
+    @staticmethod
+    def _compact_contents(docs: list):
+        # Drops sentences already seen in an earlier document, optionally
+        # caps each document at a sentence boundary and stops at the overall
+        # budget. Anything cut by a cap is logged, since it may hold the answer.
+        per_doc = settings.MAX_CONTEXT_CHARS_PER_DOC
+        remaining = settings.MAX_CONTEXT_CHARS
+        seen: set[int] = set()
+        truncated = 0
+        
+        for doc in docs:
+            if remaining <= 0:
+                truncated += len(doc.page_content)
+                continue
+            kept: list[str] = []
+            length = 0
+            sentences = _SENTENCE_BOUNDARY.split(doc.page_content)
+            for i, sentence in enumerate(sentences):
+                key = hash(sentence.lower())
+                if key in seen:
+                    continue
+                if per_doc is not None and length + len(sentence) > per_doc:
+                    partial = "" if kept else sentence[:per_doc]
+                    if partial:
+                        kept.append(partial)
+                    truncated += sum(len(rest) for rest in sentences[i:]) - len(partial)
+                    break
+                seen.add(key)
+                kept.append(sentence)
+                length += len(sentence) + 1
+            
+            if kept:
+                joined = " ".join(kept)
+                content = joined[:remaining]
+                truncated += len(joined) - len(content)
+                remaining -= len(content)
+                yield content
+        
+        if truncated:
+            logger.info("Context limits cut %d characters of retrieved text", truncated)
     
     def build_context_with_metadata(self, docs: list) -> str:
         if not docs:
             return ""
         
-        context_parts = []
-        for doc in docs:
-            metadata = doc.metadata if hasattr(doc, 'metadata') else {}
-            course_uid = metadata.get('course_uid', 'unknown')
-            context_parts.append(f"{doc.page_content}\nCourse UID: {course_uid}")
-        
-        return "\n\n".join(context_parts)
+        # Course chunks always carry course_uid (EmbeddingService sets it at
+        # ingest); the default only covers chunks from the PDF pipeline.
+        return "\n\n".join(
+            f"{doc.page_content}\nCourse UID: {doc.metadata.get('course_uid', 'unknown')}"
+            for doc in docs
+        )
@@ -2,9 +2,10 @@ import asyncio
 import logging
 from typing import Optional
 from redis.asyncio import Redis
-from app.schemas.course_event import CourseUpdateEvent
+from app.core.redis_client import decode_field, get_redis
+from app.schemas.course_event import CourseAction, CourseUpdateEvent
 from app.core.config import settings
-from app.core.container import container
+from app.services.embedding_service import EmbeddingService
 
 logger = logging.getLogger(__name__)
 
@@ -15,31 +16,17 @@ class CourseEventConsumer:
         self.consumer_group = "ai-service-group"
         self.consumer_name = "ai-service-consumer-1"
         self.running = False
-        self.embedding_service = container.get_embedding_service()
+        self.embedding_service: Optional[EmbeddingService] = None
+        self._semaphore = asyncio.Semaphore(settings.COURSE_EVENT_CONCURRENCY)
+        self._task: Optional[asyncio.Task] = None
 
     async def connect(self) -> None:
         try:
             if settings.REDIS_URL:
                 logger.info(f"Connecting to Redis via URL")
-                self.redis = await Redis.from_url(
-                    settings.REDIS_URL,
-                    decode_responses=True,
-                    socket_connect_timeout=5,
-                    socket_keepalive=True,
-                )
             else:
                 logger.info(f"Connecting to Redis via host/port")
-                self.redis = await Redis(
-                    host=settings.REDIS_HOST,
-                    port=settings.REDIS_PORT,
-                    password=settings.REDIS_PASSWORD,
-                    decode_responses=True,
-                    socket_connect_timeout=5,
-                    socket_keepalive=True,
-                    socket_keepalive_options={
-                        1: (9, 3, 3),
-                    }
-                )
+            self.redis = get_redis()
             await self.redis.ping()
         except Exception as e:
             logger.error(f"Failed to connect to Redis: {e}")
@@ -127,20 +114,14 @@ class CourseEventConsumer:
         
         logger.info(f"Starting consumer loop for stream '{self.stream_key}'")
         
+        try:
+            await self._recover_pending()
+        except Exception as e:
+            logger.error(f"Error replaying pending course events: {e}")
+        
         while self.running:
             try:
-                pending = await self.redis.xreadgroup(
-                    self.consumer_group,
-                    self.consumer_name,
-                    streams={self.stream_key: ">"},
-                    count=10,
-                    block=1000
-                )
-                
-                if pending:
-                    for stream_key, messages in pending:
-                        for message_id, data in messages:
-                            await self._process_and_ack(message_id, data)
+                await self._process_batch(await self._collect_batch())
                 
             except Exception as e:
                 logger.error(f"Error in consumer loop: {e}")
@@ -155,31 +136,144 @@ class CourseEventConsumer:
                         logger.error(f"Failed to reconnect: {reconnect_error}")
                         await asyncio.sleep(5)  # Wait before retry
 
-    async def _process_and_ack(self, message_id: str, data: dict) -> None:
-        try:
-            event = CourseUpdateEvent(
-                courseId=int(data.get("courseId", 0)),
-                courseName=data.get("courseName", ""),
-                courseDescription=data.get("courseDescription"),
-                topic=data.get("topic"),
-                courseUid=data.get("courseUid"),
-                action=data.get("action", ""),
-                timestamp=int(data.get("timestamp", 0))
-            )
+    async def _read_messages(
+        self,
+        count: int,
+        block: Optional[int],
+        start_id: str | bytes = ">"
+    ) -> list[tuple[bytes, dict]]:
+        pending = await self.redis.xreadgroup(
+            self.consumer_group,
+            self.consumer_name,
+            streams={self.stream_key: start_id},
+            count=count,
+            block=block
+        )
+        return [message for _, messages in pending or [] for message in messages]
+    
+    async def _recover_pending(self) -> None:
+        # Entries read but not acked before the last shutdown (stop() cancels
+        # mid-batch) or crash stay in this consumer's pending list, and ">"
+        # never returns them; reading from an explicit id does. The cursor
+        # moves past each page so entries that fail again are not re-read.
+        last_id: str | bytes = "0"
+        while self.running:
+            messages = await self._read_messages(settings.COURSE_EVENT_BATCH_SIZE, None, start_id=last_id)
+            if not messages:
+                return
+            logger.info(f"Replaying {len(messages)} pending course events")
+            # Entries trimmed from the stream come back without their fields
+            await self._ack([message_id for message_id, data in messages if not data])
+            await self._process_batch([message for message in messages if message[1]])
+            last_id = messages[-1][0]
+    
+    async def _process_batch(self, messages: list[tuple[bytes, dict]]) -> None:
+        # Coalesced events touch distinct courses, so they can run together;
+        # the repository serialises the index writes and only the embedding
+        # calls overlap.
+        coalesced = self._coalesce(messages)
+        results = await asyncio.gather(
+            *(self._process_messages(event, message_ids) for event, message_ids in coalesced)
+        )
+        await self._ack([
+            message_id
+            for (_, message_ids), success in zip(coalesced, results) if success
+            for message_id in message_ids
+        ])
+
+    async def _collect_batch(self) -> list[tuple[bytes, dict]]:
+        # After the first message arrives, keep reading for a short window so
+        # a burst of edits to one course lands in the same batch.
+        batch_size = settings.COURSE_EVENT_BATCH_SIZE
+        messages = await self._read_messages(batch_size, settings.STREAM_BLOCK_MS)
+        if not messages:
+            return messages
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.COURSE_EVENT_COALESCE_MS / 1000
+        while len(messages) < batch_size:
+            remaining_ms = int((deadline - loop.time()) * 1000)
+            if remaining_ms <= 0:
+                break
+            more = await self._read_messages(batch_size - len(messages), remaining_ms)
+            if not more:
+                break
+            messages.extend(more)
+        return messages
+
+    @staticmethod
+    def _parse_event(data: dict[bytes, bytes]) -> CourseUpdateEvent:
+        return CourseUpdateEvent(
+            courseId=int(data.get(b"courseId", 0)),
+            courseName=decode_field(data.get(b"courseName", b"")),
+            courseDescription=decode_field(data.get(b"courseDescription")),
+            topic=decode_field(data.get(b"topic")),
+            courseUid=decode_field(data.get(b"courseUid")),
+            action=decode_field(data.get(b"action", b"")),
+            timestamp=int(data.get(b"timestamp", 0))
+        )
+
+    def _coalesce(
+        self,
+        messages: list[tuple[bytes, dict]]
+    ) -> list[tuple[CourseUpdateEvent, list[bytes]]]:
+        # Only the latest event per course is applied; its success acks every
+        # message it superseded.
+        latest: dict[int, tuple[CourseUpdateEvent, list[bytes]]] = {}
+        for message_id, data in messages:
+            try:
+                event = self._parse_event(data)
+            except Exception as e:
+                logger.error(f"Error processing message {message_id}: {e}")
+                continue
             
-            success = await self.process_event(event)
+            previous = latest.get(event.courseId)
+            if previous is None:
+                latest[event.courseId] = (event, [message_id])
+                continue
             
-            if success:
-                await self.redis.xack(self.stream_key, self.consumer_group, message_id)
-                logger.info(f"Acknowledged message {message_id}")
-            else:
-                logger.warning(f"Event processing failed for message {message_id}, will retry")
+            previous_event, message_ids = previous
+            message_ids.append(message_id)
+            if event.timestamp >= previous_event.timestamp:
+                latest[event.courseId] = (event, message_ids)
         
+        coalesced = []
+        for event, message_ids in latest.values():
+            if len(message_ids) > 1 and event.action == CourseAction.CREATE:
+                # Other events in the burst may have left vectors behind, so
+                # replace them rather than add a second copy.
+                event = event.model_copy(update={"action": CourseAction.UPDATE})
+            coalesced.append((event, message_ids))
+        
+        if len(coalesced) < len(messages):
+            logger.info(f"Coalesced {len(messages)} course events into {len(coalesced)}")
+        return coalesced
+
+    async def _process_messages(self, event: CourseUpdateEvent, message_ids: list[bytes]) -> bool:
+        try:
+            async with self._semaphore:
+                success = await self.process_event(event)
+            if not success:
+                logger.warning(f"Event processing failed for messages {message_ids}, will retry")
+            return success
         except Exception as e:
-            logger.error(f"Error processing message {message_id}: {e}")
+            logger.error(f"Error processing messages {message_ids}: {e}")
+            return False
+
+    async def _ack(self, message_ids: list[bytes]) -> None:
+        # XACK takes any number of ids, so the whole batch is one round trip;
+        # failed messages stay pending for redelivery.
+        if not message_ids:
+            return
+        await self.redis.xack(self.stream_key, self.consumer_group, *message_ids)
+        logger.info(f"Acknowledged {len(message_ids)} messages")
 
     def stop(self) -> None:
         self.running = False
+        # The first read blocks for up to STREAM_BLOCK_MS; a batch cancelled
+        # before its XACK is replayed by _recover_pending on the next start.
+        if self._task:
+            self._task.cancel()
         logger.info("Stopping consumer loop")
 
 
@@ -187,10 +281,11 @@ class CourseEventConsumer:
 consumer = CourseEventConsumer()
 
 
-async def start_consumer():
+async def start_consumer(embedding_service: EmbeddingService):
     try:
+        consumer.embedding_service = embedding_service
         await consumer.connect()
-        asyncio.create_task(consumer.consume())
+        consumer._task = asyncio.create_task(consumer.consume())
         logger.info("Course event consumer started")
     except Exception as e:
         logger.error(f"Failed to start consumer: {e}")
@@ -1,16 +1,30 @@
+import asyncio
 import logging
-from typing import Optional
+from typing import Callable, Optional
 from app.interfaces.embedding_repository import IEmbeddingRepository
 from app.services.rag import get_text_chunks
 from app.core.config import settings
+from app.core.hashing import generate_text_hash
 
 logger = logging.getLogger(__name__)
 
 
 class EmbeddingService:
     
-    def __init__(self, repository: IEmbeddingRepository):
+    def __init__(
+        self,
+        repository: IEmbeddingRepository,
+        on_embeddings_changed: Optional[Callable[[], None]] = None
+    ):
         self.repository = repository
+        self.on_embeddings_changed = on_embeddings_changed
+        self._ingest_queue: Optional[asyncio.Queue] = None
+        self._ingest_flusher: Optional[asyncio.Task] = None
+        self._flush_tasks: set[asyncio.Task] = set()
+    
+    def _notify_changed(self) -> None:
+        if self.on_embeddings_changed is not None:
+            self.on_embeddings_changed()
     
     async def ingest_course(
         self,
@@ -33,10 +47,11 @@ class EmbeddingService:
                 return False
             
             metadatas = self._build_metadatas(
-                course_id, course_name, topic, course_uid, len(text_chunks)
+                course_id, course_name, topic, course_uid, len(text_chunks),
+                self._course_text_hash(course_text, course_uid)
             )
             
-            success = await self.repository.save_embeddings(text_chunks, metadatas)
+            success = await self._save_batched(text_chunks, metadatas)
             if not success:
                 logger.error(f"Failed to ingest course {course_id}")
             
@@ -45,6 +60,50 @@ class EmbeddingService:
             logger.error(f"Error ingesting course {course_id}: {e}", exc_info=True)
             return False
     
+    async def _save_batched(self, text_chunks: list[str], metadatas: list[dict]) -> bool:
+        if self._ingest_flusher is None or self._ingest_flusher.done():
+            self._ingest_queue = asyncio.Queue()
+            self._ingest_flusher = asyncio.create_task(self._run_ingest_flusher())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._ingest_queue.put((text_chunks, metadatas, future))
+        return await future
+    
+    async def _run_ingest_flusher(self) -> None:
+        # Courses ingested within a short window are written with a single
+        # save_embeddings call: one embedding fan-out and one index persist.
+        window = settings.INGEST_BATCH_WINDOW_MS / 1000
+        while True:
+            batch = [await self._ingest_queue.get()]
+            deadline = asyncio.get_running_loop().time() + window
+            while len(batch) < settings.INGEST_BATCH_SIZE:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._ingest_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            task = asyncio.create_task(self._flush_batch(batch))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+    
+    async def _flush_batch(self, batch: list) -> None:
+        all_chunks = [chunk for chunks, _, _ in batch for chunk in chunks]
+        all_metadatas = [metadata for _, metadatas, _ in batch for metadata in metadatas]
+        try:
+            success = await self.repository.save_embeddings(all_chunks, all_metadatas)
+        except Exception as e:
+            logger.error(f"Error saving batched embeddings: {e}", exc_info=True)
+            success = False
+        
+        if success:
+            self._notify_changed()
+        for _, _, future in batch:
+            if not future.done():
+                future.set_result(success)
+    
     async def update_course(
         self,
         course_id: int,
@@ -54,6 +113,14 @@ class EmbeddingService:
         course_uid: Optional[str] = None
     ) -> bool:
         try:
+            # An update that leaves the indexed text (name, description, topic
+            # and uid) unchanged needs no re-embedding
+            course_text = self._build_course_text(course_name, description, topic)
+            metadata = await self.repository.get_course_metadata(course_id)
+            if metadata and metadata.get("text_hash") == self._course_text_hash(course_text, course_uid):
+                logger.info(f"Course {course_id} text unchanged, skipping re-embedding")
+                return True
+            
             await self.repository.delete_embeddings(course_id)
             success = await self.ingest_course(
                 course_id, course_name, description, topic, course_uid
@@ -69,7 +136,9 @@ class EmbeddingService:
     async def delete_course(self, course_id: int) -> bool:
         try:
             success = await self.repository.delete_embeddings(course_id)
-            if not success:
+            if success:
+                self._notify_changed()
+            else:
                 logger.error(f"Failed to delete embeddings for course {course_id}")
             return success
         except Exception as e:
@@ -88,21 +157,26 @@ class EmbeddingService:
             course_text += f"Topic: {topic}"
         return course_text
     
+    @staticmethod
+    def _course_text_hash(course_text: str, course_uid: Optional[str]) -> str:
+        # course_uid is stored in chunk metadata, so a change must re-ingest too
+        return generate_text_hash(f"{course_uid}\n{course_text}")
+    
     @staticmethod
     def _build_metadatas(
         course_id: int,
         course_name: str,
         topic: Optional[str],
         course_uid: Optional[str],
-        chunk_count: int
+        chunk_count: int,
+        text_hash: str
     ) -> list[dict]:
-        return [
-            {
-                "course_id": str(course_id),
-                "course_uid": course_uid or str(course_id),
-                "course_name": course_name,
-                "topic": topic or "unknown",
-                "chunk_index": i
-            }
-            for i in range(chunk_count)
-        ]
+        # Shared fields are built once; each chunk only adds its index.
+        base = {
+            "course_id": str(course_id),
+            "course_uid": course_uid or str(course_id),
+            "course_name": course_name,
+            "topic": topic or "unknown",
+            "text_hash": text_hash
+        }
+        return [{**base, "chunk_index": i} for i in range(chunk_count)]
@@ -0,0 +1,315 @@
+import logging
+import os
+import pickle
+import threading
+import time
+from contextlib import nullcontext
+from typing import Optional
+import faiss
+import numpy as np
+import orjson
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_community.vectorstores.utils import DistanceStrategy
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# New indexes store unit-normalized vectors and rank by inner product, which
+# is cosine similarity for the Google embedding model.
+COSINE_STORE_KWARGS = {
+    "normalize_L2": True,
+    "distance_strategy": DistanceStrategy.MAX_INNER_PRODUCT,
+}
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_SNAPSHOT = "docstore.json"
+DOCSTORE_LOG = "docstore.jsonl"
+# Written by LangChain's save_local; still read for indexes saved before
+# the JSON snapshot format.
+LEGACY_DOCSTORE_PICKLE = "index.pkl"
+
+_READ_ATTEMPTS = 5
+_READ_RETRY_DELAY = 0.05
+
+# The course repository and the PDF pipeline both read, modify and persist
+# the same index directory from worker threads; every such write holds this.
+INDEX_WRITE_LOCK = threading.Lock()
+
+
+def is_cosine_index(index: faiss.Index) -> bool:
+    return index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+
+def read_vector_store(index_dir: str, embeddings) -> FAISS:
+    # Writers replace each file atomically but not all of them at once, so a
+    # read overlapping a write can pair the index with a docstore from
+    # another write. Such a pair fails the position count check; read again.
+    for attempt in range(_READ_ATTEMPTS):
+        index = faiss.read_index(os.path.join(index_dir, INDEX_FILE))
+        docstore, index_to_docstore_id = _read_docstore(index_dir)
+        if len(index_to_docstore_id) <= index.ntotal:
+            _replay_docstore_log(index_dir, index, docstore, index_to_docstore_id)
+            # Positions come from range(ntotal), so equal counts mean full coverage
+            if len(index_to_docstore_id) == index.ntotal:
+                break
+        if attempt == _READ_ATTEMPTS - 1:
+            raise RuntimeError(
+                f"FAISS index in {index_dir} has {index.ntotal} vectors but its "
+                f"docstore maps {len(index_to_docstore_id)}"
+            )
+        time.sleep(_READ_RETRY_DELAY)
+    
+    store_kwargs = COSINE_STORE_KWARGS if is_cosine_index(index) else {}
+    vector_store = FAISS(embeddings, index, docstore, index_to_docstore_id, **store_kwargs)
+    return configure_search(vector_store)
+
+
+def _read_docstore(index_dir: str) -> tuple[InMemoryDocstore, dict]:
+    snapshot_path = os.path.join(index_dir, DOCSTORE_SNAPSHOT)
+    if not os.path.exists(snapshot_path):
+        with open(os.path.join(index_dir, LEGACY_DOCSTORE_PICKLE), "rb") as f:
+            return pickle.load(f)
+    
+    with open(snapshot_path, "rb") as f:
+        snapshot = orjson.loads(f.read())
+    docs = snapshot["docs"]
+    docstore = InMemoryDocstore({
+        doc_id: Document(page_content=doc["page_content"], metadata=doc["metadata"])
+        for doc_id, doc in docs.items()
+    })
+    return docstore, dict(enumerate(snapshot["ids"]))
+
+
+def _write_docstore(vector_store: FAISS, index_dir: str) -> None:
+    index_to_docstore_id = vector_store.index_to_docstore_id
+    docstore = vector_store.docstore._dict
+    ids = [index_to_docstore_id[position] for position in range(len(index_to_docstore_id))]
+    write_file_atomic(os.path.join(index_dir, DOCSTORE_SNAPSHOT), orjson.dumps({
+        "ids": ids,
+        "docs": {
+            doc_id: {
+                "page_content": docstore[doc_id].page_content,
+                "metadata": docstore[doc_id].metadata
+            }
+            for doc_id in ids
+        }
+    }))
+
+
+def _fsync_path(path: str) -> None:
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+
+
+def write_file_atomic(path: str, data: bytes) -> None:
+    """Replace ``path`` with ``data``; readers see the old or the new file, never a partial one."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _write_index_tmp(index: faiss.Index, index_dir: str) -> str:
+    # faiss.write_index truncates its target, so it never writes index.faiss
+    # directly; the caller os.replace()s the returned path into place.
+    tmp_path = os.path.join(index_dir, INDEX_FILE + ".tmp")
+    faiss.write_index(index, tmp_path)
+    _fsync_path(tmp_path)
+    return tmp_path
+
+
+def _use_fp16_storage() -> bool:
+    return settings.FAISS_VECTOR_STORAGE == "fp16"
+
+
+def _add_vectors(index: faiss.Index, vectors: np.ndarray) -> faiss.Index:
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def _replay_docstore_log(index_dir: str, index: faiss.Index, docstore, index_to_docstore_id: dict) -> None:
+    try:
+        f = open(os.path.join(index_dir, DOCSTORE_LOG), "rb")
+    except FileNotFoundError:
+        # No log, or a compaction removed it after the snapshot was read; it
+        # removes the log before replacing the snapshot, so the caller's
+        # position count check catches the second case and reads again.
+        return
+    with f:
+        for line in f:
+            # A line still being appended by a concurrent write
+            if not line.endswith(b"\n"):
+                break
+            entry = orjson.loads(line)
+            # Entries past ntotal were logged but their vectors never reached
+            # index.faiss (the log is written first).
+            if entry["position"] >= index.ntotal:
+                continue
+            # A write that crashed before committing its vectors leaves
+            # entries whose positions a later write reused; the later entry
+            # wins and the orphaned document must not linger in the docstore.
+            previous_id = index_to_docstore_id.get(entry["position"])
+            if previous_id is not None and previous_id != entry["id"]:
+                docstore._dict.pop(previous_id, None)
+            docstore._dict[entry["id"]] = Document(
+                page_content=entry["page_content"],
+                metadata=entry["metadata"]
+            )
+            index_to_docstore_id[entry["position"]] = entry["id"]
+
+
+def persist_vector_store(
+    vector_store: FAISS,
+    index_dir: str,
+    new_doc_ids: Optional[list[str]] = None
+) -> None:
+    """Write ``vector_store`` to ``index_dir``.
+    
+    When only ``new_doc_ids`` were appended, the new documents go to an
+    append-only docstore log and just index.faiss is rewritten, instead of
+    re-serializing the whole docstore. Any other change writes a full
+    orjson snapshot.
+    
+    Every file is replaced atomically, in an order where an interleaved
+    read sees either a consistent generation or one read_vector_store
+    rejects: log entries are written before the vectors they describe
+    (and skipped until those land), and a snapshot only replaces the old
+    one after the log it supersedes is gone.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    log_path = os.path.join(index_dir, DOCSTORE_LOG)
+    log_size = os.path.getsize(log_path) if os.path.exists(log_path) else 0
+    has_snapshot = os.path.exists(os.path.join(index_dir, DOCSTORE_SNAPSHOT))
+    
+    if new_doc_ids and has_snapshot and log_size < settings.FAISS_DOCSTORE_LOG_MAX_BYTES:
+        start = vector_store.index.ntotal - len(new_doc_ids)
+        with open(log_path, "ab") as f:
+            for offset, doc_id in enumerate(new_doc_ids):
+                doc = vector_store.docstore.search(doc_id)
+                f.write(orjson.dumps({
+                    "position": start + offset,
+                    "id": doc_id,
+                    "page_content": doc.page_content,
+                    "metadata": doc.metadata
+                }) + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(_write_index_tmp(vector_store.index, index_dir), os.path.join(index_dir, INDEX_FILE))
+        return
+    
+    tmp_index_path = _write_index_tmp(vector_store.index, index_dir)
+    # Dropping the log first leaves the old snapshot short of the old index
+    # (rejected) rather than replaying old positions over the new snapshot.
+    if os.path.exists(log_path):
+        os.remove(log_path)
+    _write_docstore(vector_store, index_dir)
+    os.replace(tmp_index_path, os.path.join(index_dir, INDEX_FILE))
+    legacy_path = os.path.join(index_dir, LEGACY_DOCSTORE_PICKLE)
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+
+
+def remove_index_files(index_dir: str) -> None:
+    for name in (INDEX_FILE, DOCSTORE_SNAPSHOT, DOCSTORE_LOG, LEGACY_DOCSTORE_PICKLE):
+        path = os.path.join(index_dir, name)
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except Exception as e:
+                logger.warning(f"Could not delete index file {path}: {e}")
+
+
+def new_hnsw_index(dimension: int, metric: int = faiss.METRIC_L2) -> faiss.IndexHNSW:
+    if _use_fp16_storage():
+        index = faiss.IndexHNSWSQ(
+            dimension, faiss.ScalarQuantizer.QT_fp16, settings.FAISS_HNSW_M, metric
+        )
+    else:
+        index = faiss.IndexHNSWFlat(dimension, settings.FAISS_HNSW_M, metric)
+    index.hnsw.efConstruction = settings.FAISS_HNSW_EF_CONSTRUCTION
+    index.hnsw.efSearch = settings.FAISS_HNSW_EF_SEARCH
+    return index
+
+
+def new_flat_index(dimension: int, metric: int = faiss.METRIC_L2) -> faiss.Index:
+    # fp16 codes halve the bytes scanned per query on the memory-bound flat
+    # path and still support in-place remove_ids.
+    if _use_fp16_storage():
+        return faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16, metric)
+    return faiss.IndexFlat(dimension, metric)
+
+
+def configure_search(vector_store: FAISS) -> FAISS:
+    if isinstance(vector_store.index, faiss.IndexHNSW):
+        vector_store.index.hnsw.efSearch = settings.FAISS_HNSW_EF_SEARCH
+    return vector_store
+
+
+def search_params(index: faiss.Index, ef_search: Optional[int], k: int):
+    # Per-query efSearch override; flat and SQ indexes scan exhaustively and
+    # take no parameters. efSearch below k would cap the results returned.
+    if ef_search is None or not isinstance(index, faiss.IndexHNSW):
+        return None
+    return faiss.SearchParametersHNSW(efSearch=max(ef_search, k))
+
+
+def maybe_upgrade_index(vector_store: FAISS) -> FAISS:
+    # Flat search is exact and cheapest for small corpora; switch to an
+    # HNSW graph once a full scan per query starts to dominate latency.
+    index = vector_store.index
+    if isinstance(index, faiss.IndexHNSW):
+        return vector_store
+    
+    if index.ntotal >= settings.FAISS_HNSW_MIN_VECTORS:
+        logger.info(f"Converting flat FAISS index with {index.ntotal} vectors to HNSW")
+        new_index = new_hnsw_index(index.d, index.metric_type)
+    elif isinstance(index, faiss.IndexFlat) and _use_fp16_storage():
+        new_index = new_flat_index(index.d, index.metric_type)
+    else:
+        return vector_store
+    
+    vector_store.index = _add_vectors(new_index, index.reconstruct_n(0, index.ntotal))
+    return vector_store
+
+
+def remove_documents(vector_store: FAISS, doc_ids: list[str], swap_lock=None) -> None:
+    """Remove ``doc_ids`` from the store without re-embedding anything.
+    
+    ``swap_lock`` is held only while the store is mutated; callers pass the
+    lock their searches take. An HNSW graph is rebuilt before taking it, so
+    searches keep using the old graph meanwhile. The caller must hold
+    INDEX_WRITE_LOCK so no other write changes the store during the rebuild.
+    """
+    swap_lock = swap_lock or nullcontext()
+    if not isinstance(vector_store.index, faiss.IndexHNSW):
+        with swap_lock:
+            vector_store.delete(ids=doc_ids)
+        return
+    
+    # HNSW graphs do not support remove_ids; rebuild the graph from the
+    # stored vectors of the documents that are kept.
+    to_remove = set(doc_ids)
+    kept_positions = [
+        position
+        for position, doc_id in sorted(vector_store.index_to_docstore_id.items())
+        if doc_id not in to_remove
+    ]
+    index = vector_store.index
+    vectors = index.reconstruct_n(0, index.ntotal)[np.asarray(kept_positions, dtype=np.int64)]
+    
+    hnsw_index = _add_vectors(new_hnsw_index(index.d, index.metric_type), vectors)
+    index_to_docstore_id = {
+        new_position: vector_store.index_to_docstore_id[old_position]
+        for new_position, old_position in enumerate(kept_positions)
+    }
+    
+    with swap_lock:
+        vector_store.docstore.delete(doc_ids)
+        vector_store.index_to_docstore_id = index_to_docstore_id
+        vector_store.index = hnsw_index
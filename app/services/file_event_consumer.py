@@ -2,6 +2,7 @@ import asyncio
 import logging
 from typing import Optional
 from redis.asyncio import Redis
+from app.core.redis_client import decode_field, get_redis
 from app.schemas.file_event import FileUpdateEvent
 from app.services.file_event_service import FileEventService
 from app.core.config import settings
@@ -16,32 +17,18 @@ class FileEventConsumer:
         self.consumer_group = "ai-service-group"
         self.consumer_name = "ai-service-file-consumer-1"
         self.running = False
+        self._semaphore = asyncio.Semaphore(settings.FILE_EVENT_CONCURRENCY)
+        self._task: Optional[asyncio.Task] = None
 
     async def connect(self) -> None:
         try:
             if settings.REDIS_URL:
                 logger.info(f"Connecting to Redis via URL for file events")
-                self.redis = await Redis.from_url(
-                    settings.REDIS_URL,
-                    decode_responses=True,
-                    socket_connect_timeout=5,
-                    socket_keepalive=True,
-                )
                 connection_info = "Render Redis Cloud"
             else:
                 logger.info(f"Connecting to Redis via host/port for file events")
-                self.redis = await Redis(
-                    host=settings.REDIS_HOST,
-                    port=settings.REDIS_PORT,
-                    password=settings.REDIS_PASSWORD,
-                    decode_responses=True,
-                    socket_connect_timeout=5,
-                    socket_keepalive=True,
-                    socket_keepalive_options={
-                        1: (9, 3, 3),
-                    }
-                )
                 connection_info = f"{settings.REDIS_HOST}:{settings.REDIS_PORT}"
+            self.redis = get_redis()
             
             # Test connection
             await self.redis.ping()
@@ -81,20 +68,14 @@ class FileEventConsumer:
         
         logger.info(f"Starting file event consumer for stream '{self.stream_key}'")
         
+        try:
+            await self._recover_pending()
+        except Exception as e:
+            logger.error(f"Error replaying pending file events: {e}")
+        
         while self.running:
             try:
-                pending = await self.redis.xreadgroup(
-                    self.consumer_group,
-                    self.consumer_name,
-                    streams={self.stream_key: ">"},
-                    count=10,
-                    block=1000
-                )
-                
-                if pending:
-                    for stream_key, messages in pending:
-                        for message_id, data in messages:
-                            await self._process_and_ack_file(message_id, data)
+                await self._process_batch(await self._read_messages(settings.STREAM_BLOCK_MS))
                 
             except Exception as e:
                 logger.error(f"Error in file consumer loop: {e}")
@@ -108,33 +89,92 @@ class FileEventConsumer:
                         logger.error(f"Failed to reconnect: {reconnect_error}")
                         await asyncio.sleep(5)  # Wait before retry
 
-    async def _process_and_ack_file(self, message_id: str, data: dict) -> None:
+    async def _read_messages(
+        self,
+        block: Optional[int],
+        start_id: str | bytes = ">"
+    ) -> list[tuple[bytes, dict]]:
+        pending = await self.redis.xreadgroup(
+            self.consumer_group,
+            self.consumer_name,
+            streams={self.stream_key: start_id},
+            count=settings.FILE_EVENT_BATCH_SIZE,
+            block=block
+        )
+        return [message for _, messages in pending or [] for message in messages]
+    
+    async def _recover_pending(self) -> None:
+        # Entries read but not acked before the last shutdown or crash stay
+        # in this consumer's pending list, which ">" never returns; page
+        # through it from id "0" so entries that fail again are not re-read.
+        last_id: str | bytes = "0"
+        while self.running:
+            messages = await self._read_messages(None, start_id=last_id)
+            if not messages:
+                return
+            logger.info(f"Replaying {len(messages)} pending file events")
+            # Entries trimmed from the stream come back without their fields
+            await self._ack([message_id for message_id, data in messages if not data])
+            await self._process_batch([message for message in messages if message[1]])
+            last_id = messages[-1][0]
+    
+    async def _process_batch(self, messages: list[tuple[bytes, dict]]) -> None:
+        # Different files are processed concurrently; events for the same
+        # file keep their stream order.
+        by_file: dict[bytes, list[tuple[bytes, dict]]] = {}
+        for message_id, data in messages:
+            by_file.setdefault(data.get(b"fileId", b""), []).append((message_id, data))
+        results = await asyncio.gather(
+            *(self._process_file_messages(messages) for messages in by_file.values())
+        )
+        await self._ack([message_id for acked in results for message_id in acked])
+    
+    async def _process_file_messages(self, messages: list[tuple[bytes, dict]]) -> list[bytes]:
+        async with self._semaphore:
+            return [
+                message_id
+                for message_id, data in messages
+                if await self._process_file_message(message_id, data)
+            ]
+
+    async def _process_file_message(self, message_id: bytes, data: dict) -> bool:
         try:
+            size = data.get(b"size")
             event = FileUpdateEvent(
-                file_id=data.get("fileId", ""),
-                filename=data.get("filename", ""),
-                download_url=data.get("downloadUrl", ""),
-                action=data.get("action", ""),
-                user_id=data.get("userId"),
-                size=int(data.get("size", 0)) if data.get("size") else None,
-                content_type=data.get("contentType", "application/pdf"),
-                timestamp=int(data.get("timestamp", 0))
+                file_id=decode_field(data.get(b"fileId", b"")),
+                filename=decode_field(data.get(b"filename", b"")),
+                download_url=decode_field(data.get(b"downloadUrl", b"")),
+                action=decode_field(data.get(b"action", b"")),
+                user_id=decode_field(data.get(b"userId")),
+                size=int(size) if size else None,
+                content_type=decode_field(data.get(b"contentType", b"application/pdf")),
+                timestamp=int(data.get(b"timestamp", 0))
             )
             
             logger.info(f"Processing file event: {event.action} - {event.file_id}")
             success = await FileEventService.handle_file_event(event)
             
-            if success:
-                await self.redis.xack(self.stream_key, self.consumer_group, message_id)
-                logger.info(f"Acknowledged file event message {message_id}")
-            else:
+            if not success:
                 logger.warning(f"File event processing failed for message {message_id}, will retry")
+            return success
         
         except Exception as e:
             logger.error(f"Error processing file message {message_id}: {e}", exc_info=True)
+            return False
+
+    async def _ack(self, message_ids: list[bytes]) -> None:
+        # One XACK for the whole batch; failed messages stay pending
+        if not message_ids:
+            return
+        await self.redis.xack(self.stream_key, self.consumer_group, *message_ids)
+        logger.info(f"Acknowledged {len(message_ids)} file event messages")
 
     def stop(self) -> None:
         self.running = False
+        # The read blocks for up to STREAM_BLOCK_MS; a batch cancelled before
+        # its XACK is replayed by _recover_pending on the next start.
+        if self._task:
+            self._task.cancel()
         logger.info("Stopping file event consumer")
 
 
@@ -145,7 +185,7 @@ file_consumer = FileEventConsumer()
 async def start_file_consumer():
     try:
         await file_consumer.connect()
-        asyncio.create_task(file_consumer.consume())
+        file_consumer._task = asyncio.create_task(file_consumer.consume())
         logger.info("File event consumer started")
     except Exception as e:
         logger.error(f"Failed to start file consumer: {e}")
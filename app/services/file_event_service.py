@@ -1,11 +1,11 @@
+import asyncio
 import logging
-import hashlib
-from datetime import datetime
 from app.schemas.file_event import FileUpdateEvent
 from app.services.pdf import process_files_from_urls
 from app.services.rag import delete_vectors_by_file_id
 from app.core.mongodb import db
 from app.core.config import settings
+from app.core.hashing import URL_HASH_ALGO, generate_url_hash, legacy_url_hash
 
 logger = logging.getLogger(__name__)
 
@@ -14,7 +14,7 @@ class FileEventService:
     
     @staticmethod
     def _generate_url_hash(url: str) -> str:
-        return hashlib.sha256(url.encode()).hexdigest()
+        return generate_url_hash(url)
     
     @staticmethod
     async def handle_file_event(event: FileUpdateEvent) -> bool:
@@ -40,7 +40,9 @@ class FileEventService:
         try:
             url_hash = FileEventService._generate_url_hash(event.download_url)
             
-            existing = db.files.find_one({"url_hash": url_hash})
+            existing = await db.files.find_one({
+                "url_hash": {"$in": [url_hash, legacy_url_hash(event.download_url)]}
+            })
             if existing:
                 logger.info(f"File {event.file_id} already exists, skipping creation")
                 return True
@@ -50,32 +52,26 @@ class FileEventService:
                 "filename": event.filename,
                 "download_url": event.download_url,
                 "url_hash": url_hash,
+                "hash_algo": URL_HASH_ALGO,
                 "user_id": event.user_id,
                 "size": event.size,
                 "content_type": event.content_type,
-                "upload_date": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                "upload_date": settings.now_string(),
                 "embedding_created": False,
                 "processed_date": None
             }
             
-            result = db.files.insert_one(file_doc)
+            result = await db.files.insert_one(file_doc)
             logger.info(f"Inserted file document: {result.inserted_id}")
             
+            # process_files_from_urls flags the document (matched by url_hash)
+            # when it records the processed file.
             success = await FileEventService._process_file_embeddings(
                 event.download_url,
                 url_hash
             )
             
             if success:
-                db.files.update_one(
-                    {"_id": result.inserted_id},
-                    {
-                        "$set": {
-                            "embedding_created": True,
-                            "processed_date": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        }
-                    }
-                )
                 logger.info(f"Successfully created embeddings for file {event.file_id}")
             else:
                 logger.warning(f"Failed to create embeddings for file {event.file_id}")
@@ -90,7 +86,7 @@ class FileEventService:
     async def _handle_file_update(event: FileUpdateEvent) -> bool:
         try:
             
-            result = db.files.update_one(
+            updated = await db.files.find_one_and_update(
                 {"file_id": event.file_id},
                 {
                     "$set": {
@@ -99,16 +95,22 @@ class FileEventService:
                         "size": event.size,
                         "content_type": event.content_type
                     }
-                }
+                },
+                projection={"_id": 1}
             )
-            _id_ai_service=db.files.find_one({"file_id": event.file_id}).get("_id")
-            if result.matched_count == 0:
+            if updated is None:
                 logger.warning(f"File {event.file_id} not found during update")
                 return False
+            _id_ai_service = updated["_id"]
             
             
             url_hash = FileEventService._generate_url_hash(event.download_url)
-            delete_vectors_by_file_id(event.file_id, file_id_AI_service=_id_ai_service , api_key=settings.API_KEY)
+            await asyncio.to_thread(
+                delete_vectors_by_file_id,
+                event.file_id,
+                file_id_AI_service=_id_ai_service,
+                api_key=settings.API_KEY
+            )
             
             success = await FileEventService._process_file_embeddings(
                 event.download_url,
@@ -116,12 +118,12 @@ class FileEventService:
             )
             
             if success:
-                db.files.update_one(
+                await db.files.update_one(
                     {"file_id": event.file_id},
                     {
                         "$set": {
                             "embedding_created": True,
-                            "processed_date": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                            "processed_date": settings.now_string()
                         }
                     }
                 )
@@ -139,15 +141,22 @@ class FileEventService:
     async def _handle_file_delete(event: FileUpdateEvent) -> bool:
         try:
             
-            _id_ai_service=db.files.find_one({"file_id": event.file_id}).get("_id")
-            
-            result = db.files.delete_one({"file_id": event.file_id})
+            deleted = await db.files.find_one_and_delete(
+                {"file_id": event.file_id},
+                projection={"_id": 1}
+            )
             
-            if result.deleted_count == 0:
+            if deleted is None:
                 logger.warning(f"File {event.file_id} not found during deletion")
                 return False
-            db.processed_files.delete_one({"file_id": str(_id_ai_service)})
-            delete_vectors_by_file_id(event.file_id, file_id_AI_service=_id_ai_service, api_key=settings.API_KEY)
+            _id_ai_service = deleted["_id"]
+            await db.processed_files.delete_one({"file_id": str(_id_ai_service)})
+            await asyncio.to_thread(
+                delete_vectors_by_file_id,
+                event.file_id,
+                file_id_AI_service=_id_ai_service,
+                api_key=settings.API_KEY
+            )
             
             logger.info(f"Successfully deleted file {event.file_id} and its embeddings")
             return True
@@ -1,35 +1,58 @@
+import asyncio
 import logging
-import hashlib
-from datetime import datetime
-from typing import List
+from typing import List, Optional
 from bson import ObjectId
 from app.schemas.files import FileMetadata, ProcessFilesResponse
 from app.services.pdf import process_files_from_urls
 from app.services.rag import delete_vectors_by_file_id
 from app.core.mongodb import db
 from app.core.config import settings
+from app.core.hashing import URL_HASH_ALGO, generate_url_hash, legacy_url_hash
 
 logger = logging.getLogger(__name__)
 
 
 class FileManagementService:
     
+    _FILE_LIST_PROJECTION = {
+        "_id": 0,
+        "file_id": {"$toString": "$_id"},
+        "filename": 1,
+        "download_url": 1,
+        "embedding_created": 1
+    }
+    
     @staticmethod
-    def register_files(files_metadata: List[FileMetadata]) -> List[dict]:
+    async def register_files(files_metadata: List[FileMetadata]) -> List[dict]:
         """Register uploaded files in the database."""
         try:
-            file_infos = []
-            for file_meta in files_metadata:
-                url_hash = FileManagementService._generate_url_hash(file_meta.download_url)
-                existing = FileManagementService._check_existing_file(url_hash)
-                
-                file_info = FileManagementService._create_file_info(
-                    file_meta, url_hash, existing
+            if not files_metadata:
+                return []
+            
+            url_hashes = [
+                FileManagementService._generate_url_hash(file_meta.download_url)
+                for file_meta in files_metadata
+            ]
+            legacy_hashes = [
+                legacy_url_hash(file_meta.download_url)
+                for file_meta in files_metadata
+            ]
+            existing_files = await FileManagementService._find_existing_files(
+                url_hashes + legacy_hashes
+            )
+            
+            file_infos = [
+                FileManagementService._create_file_info(
+                    file_meta,
+                    url_hash,
+                    existing_files.get(url_hash) or existing_files.get(legacy_hash)
                 )
-                
-                result = db.files.insert_one(file_info)
-                file_info["_id"] = str(result.inserted_id)
-                file_infos.append(file_info)
+                for file_meta, url_hash, legacy_hash in zip(files_metadata, url_hashes, legacy_hashes)
+            ]
+            
+            result = await db.files.insert_many(file_infos, ordered=False)
+            for file_info, inserted_id in zip(file_infos, result.inserted_ids):
+                file_info["_id"] = str(inserted_id)
             
             return file_infos
         except Exception as e:
@@ -37,24 +60,37 @@ class FileManagementService:
             raise ValueError(f"Failed to register files: {str(e)}")
     
     @staticmethod
-    def list_pdf_files(user_id: str = None) -> List[dict]:
+    async def list_pdf_files(
+        user_id: str = None,
+        skip: int = 0,
+        limit: Optional[int] = None
+    ) -> List[dict]:
         try:
             query = {"user_id": user_id} if user_id else {}
-            files = list(db.files.find(query))
-            
-            return FileManagementService._format_file_list(files)
+            pipeline = [{"$match": query}]
+            # Page before projecting so skipped documents are never reshaped
+            if skip or limit:
+                pipeline.append({"$sort": {"_id": 1}})
+            if skip:
+                pipeline.append({"$skip": skip})
+            if limit:
+                pipeline.append({"$limit": limit})
+            pipeline.append({"$project": FileManagementService._FILE_LIST_PROJECTION})
+            # PyMongo's async aggregate is awaited for its cursor
+            cursor = await db.files.aggregate(pipeline)
+            return await cursor.to_list(length=None)
         except Exception as e:
             logger.error(f"Error listing PDF files: {e}")
             raise ValueError(f"Failed to list PDF files: {str(e)}")
     
     @staticmethod
-    def delete_pdf_file(file_id: str) -> bool:
+    async def delete_pdf_file(file_id: str) -> bool:
         try:
-            result = db.files.delete_one({"_id": ObjectId(file_id)})
+            result = await db.files.delete_one({"_id": ObjectId(file_id)})
             if result.deleted_count == 0:
                 raise ValueError(f"PDF file with ID {file_id} not found")
             
-            FileManagementService._delete_embeddings(file_id)
+            await FileManagementService._delete_embeddings(file_id)
             
             return True
         except Exception as e:
@@ -65,7 +101,7 @@ class FileManagementService:
     async def process_unprocessed_files() -> ProcessFilesResponse:
         try:
             query = {"embedding_created": False}
-            unprocessed_files = list(db.files.find(query))
+            unprocessed_files = await db.files.find(query).to_list(length=None)
             
             if not unprocessed_files:
                 logger.info("No files to process")
@@ -87,11 +123,15 @@ class FileManagementService:
     
     @staticmethod
     def _generate_url_hash(url: str) -> str:
-        return hashlib.sha256(url.encode()).hexdigest()
+        return generate_url_hash(url)
     
     @staticmethod
-    def _check_existing_file(url_hash: str) -> dict:
-        return db.processed_files.find_one({"url_hash": url_hash})
+    async def _find_existing_files(url_hashes: List[str]) -> dict:
+        cursor = db.processed_files.find(
+            {"url_hash": {"$in": url_hashes}},
+            {"url_hash": 1, "processed_date": 1}
+        )
+        return {doc["url_hash"]: doc async for doc in cursor}
     
     @staticmethod
     def _create_file_info(
@@ -103,31 +143,22 @@ class FileManagementService:
             "filename": file_meta.filename,
             "download_url": file_meta.download_url,
             "url_hash": url_hash,
+            "hash_algo": URL_HASH_ALGO,
             "user_id": file_meta.user_id,
             "size": file_meta.size,
             "content_type": file_meta.content_type,
-            "upload_date": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "upload_date": settings.now_string(),
             "embedding_created": existing is not None,
             "processed_date": existing.get("processed_date") if existing else None
         }
     
     @staticmethod
-    def _format_file_list(files: list) -> List[dict]:
-        result = []
-        for doc in files:
-            doc["file_id"] = str(doc["_id"])
-            doc.pop("_id", None)
-            result.append(doc)
-        return result
-    
-    @staticmethod
-    def _delete_embeddings(file_id: str) -> None:
-        existing_file = db.files.find_one({"_id": ObjectId(file_id)})
+    async def _delete_embeddings(file_id: str) -> None:
+        existing_file = await db.files.find_one({"_id": ObjectId(file_id)})
         if existing_file:
-            delete_vectors_by_file_id(
+            await asyncio.to_thread(
+                delete_vectors_by_file_id,
                 file_id,
                 file_id_AI_service=existing_file.get("_id"),
                 api_key=settings.API_KEY
             )
-
-            raise ValueError(f"Failed to process files: {str(e)}")
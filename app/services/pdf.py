@@ -1,41 +1,108 @@
-import io
+import asyncio
+import multiprocessing
 import os
 import tempfile
-from typing import List, Tuple
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, Optional, Tuple
 import aiohttp
-from PyPDF2 import PdfReader
-from app.services.rag import get_text_chunks, get_vector_store
+import fitz
+from app.services.rag import clone_vectors_for_file, get_text_chunks, get_vector_store
 from app.core.config import settings
+from app.core.hashing import new_content_hasher
+from app.core.retry import retry_transient
 
-async def download_file_from_url(url: str, timeout: int = 300) -> bytes:
-    async with aiohttp.ClientSession() as session:
+_http_session: Optional[aiohttp.ClientSession] = None
+
+def _get_http_session() -> aiohttp.ClientSession:
+    # One pooled session so repeated downloads reuse DNS lookups and
+    # keep-alive TLS connections; created lazily on the running loop.
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=settings.HTTP_MAX_CONNECTIONS,
+                limit_per_host=settings.HTTP_MAX_CONNECTIONS_PER_HOST,
+                ttl_dns_cache=300,
+                keepalive_timeout=60,
+            )
+        )
+    return _http_session
+
+async def close_http_session() -> None:
+    global _http_session
+    if _http_session is not None:
+        await _http_session.close()
+        _http_session = None
+
+@retry_transient
+async def download_file_to_temp(url: str, timeout: int = 300, suffix: str = ".pdf") -> Tuple[str, str]:
+    # Streams the body to disk in 1 MiB chunks so a large PDF is never held
+    # in memory, hashing it on the way; the caller deletes the file with
+    # delete_temp_file. Returns (path, content_hash).
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+    hasher = new_content_hasher()
+    try:
+        session = _get_http_session()
         async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
             response.raise_for_status()
-            return await response.read()
-
-def extract_text_from_pdf_bytes(pdf_bytes: bytes) -> str:
+            async for chunk in response.content.iter_chunked(1 << 20):
+                temp_file.write(chunk)
+                hasher.update(chunk)
+        return temp_file.name, hasher.hexdigest()
+    except BaseException:
+        temp_file.close()
+        delete_temp_file(temp_file.name)
+        raise
+    finally:
+        temp_file.close()
 
-    text = ""
+def extract_text_from_pdf_file(file_path: str) -> str:
+    # MuPDF parses in C and reads pages from the file on demand
+    page_texts = []
     try:
-        with io.BytesIO(pdf_bytes) as pdf_file:
-            pdf_reader = PdfReader(pdf_file)
-            for page in pdf_reader.pages:
-                page_text = page.extract_text()
+        with fitz.open(file_path, filetype="pdf") as document:
+            for page in document:
+                page_text = page.get_text("text")
                 if page_text:
-                    text += page_text + "\n"
+                    page_texts.append(page_text + "\n")
     except Exception as e:
         print(f"Error extracting text from PDF: {e}")
-    return text
+    return "".join(page_texts)
 
-def save_temp_file(content: bytes, suffix: str = ".pdf") -> str:
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-    try:
-        temp_file.write(content)
-        temp_file.flush()
-        return temp_file.name
-    finally:
-        temp_file.close()
+
+@lru_cache(maxsize=1)
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    # Created on first use, when the loop and the to_thread workers
+    # already run threads; forking then could copy a held lock into the
+    # child, so workers start from a clean forkserver process instead.
+    return ProcessPoolExecutor(
+        max_workers=settings.PDF_EXTRACT_WORKERS,
+        mp_context=multiprocessing.get_context("forkserver")
+    )
+
+
+def extract_chunks_from_pdf_file(file_path: str, model_name: str) -> List[str]:
+    text = extract_text_from_pdf_file(file_path)
+    if not text.strip():
+        return []
+    return get_text_chunks(text, model_name)
+
+
+async def extract_chunks_from_pdf_file_async(file_path: str, model_name: str) -> List[str]:
+    # Parsing and splitting are CPU work; a process pool runs them off the
+    # event loop and across cores. Only the path crosses the process
+    # boundary, not the PDF bytes.
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_pdf_pool(), extract_chunks_from_pdf_file, file_path, model_name
+    )
+
+
+def shutdown_pdf_pool() -> None:
+    if _get_pdf_pool.cache_info().currsize:
+        _get_pdf_pool().shutdown(wait=False, cancel_futures=True)
+        _get_pdf_pool.cache_clear()
 
 def delete_temp_file(file_path: str):
     try:
@@ -44,77 +111,121 @@ def delete_temp_file(file_path: str):
     except Exception as e:
         print(f"Error deleting temp file {file_path}: {e}")
 
+async def _record_processed_file(db, url_hash: str, file_id: str, content_hash: str, chunks_count: int) -> None:
+    # Written as soon as a file's vectors are saved, so a crash later in the
+    # batch does not leave persisted vectors unrecorded. The upsert tolerates
+    # a row left by an earlier run, and the files update runs even if the
+    # processed_files write fails so embedding_created is not left False.
+    processed_date = settings.now_string()
+    try:
+        await db.processed_files.update_one(
+            {"url_hash": url_hash},
+            {"$set": {
+                "file_id": file_id,
+                "content_hash": content_hash,
+                "processed_date": processed_date,
+                "chunks_count": chunks_count
+            }},
+            upsert=True
+        )
+    finally:
+        await db.files.update_one(
+            {"url_hash": url_hash},
+            {"$set": {
+                "embedding_created": True,
+                "processed_date": processed_date
+            }}
+        )
+
 async def process_files_from_urls(download_urls: List[Tuple[str, str]], db) -> int:
-    processed_count = 0
+    # One $in lookup per collection instead of two find_one calls per URL
+    url_hashes = [url_hash for _, url_hash in download_urls]
+    processed_hashes = {
+        doc["url_hash"]
+        async for doc in db.processed_files.find(
+            {"url_hash": {"$in": url_hashes}}, {"url_hash": 1}
+        )
+    }
+    file_docs = {
+        doc["url_hash"]: doc
+        async for doc in db.files.find(
+            {"url_hash": {"$in": url_hashes}}, {"url_hash": 1}
+        )
+    }
+    
+    # Content hashes embedded earlier in this batch, including files whose
+    # processed_files row is still being written.
+    batch_content = {}
     
-    for url, url_hash in download_urls:
+    async def process_one(url: str, url_hash: str) -> bool:
         temp_file_path = None
         try:
-            if db.processed_files.find_one({"url_hash": url_hash}):
-                continue
-            
-            print(f"Downloading file from {url}...")
-            file_content = await download_file_from_url(url)
-            
-            text = extract_text_from_pdf_bytes(file_content)
+            if url_hash in processed_hashes:
+                return False
+            processed_hashes.add(url_hash)
             
-            if not text.strip():
-                print(f"No text extracted from {url}, skipping...")
-                continue
-            
-            chunks = get_text_chunks(text, settings.MODEL_NAME)
-            
-            file_doc = db.files.find_one({"url_hash": url_hash})
+            file_doc = file_docs.get(url_hash)
             if not file_doc:
                 print(f"File document not found for {url_hash}, skipping...")
-                continue
+                return False
             
             file_id = str(file_doc.get("_id", url_hash))
             
-            # Insert into processed_files collection
-            db.processed_files.insert_one({
-                "url_hash": url_hash,
-                "file_id": file_id,
-                "processed_date": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                "chunks_count": len(chunks)
-            })
+            print(f"Downloading file from {url}...")
+            temp_file_path, content_hash = await download_file_to_temp(url)
             
-            # Update file document to mark embedding as created
-            db.files.update_one(
-                {"url_hash": url_hash},
-                {"$set": {
-                    "embedding_created": True,
-                    "processed_date": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                }}
+            # Same bytes already embedded under another URL: copy those
+            # vectors instead of extracting and embedding again.
+            chunks_count = 0
+            duplicate = batch_content.get(content_hash) or await db.processed_files.find_one(
+                {"content_hash": content_hash}, {"file_id": 1}
             )
+            if duplicate:
+                try:
+                    chunks_count = await asyncio.to_thread(
+                        clone_vectors_for_file,
+                        duplicate["file_id"], file_id, url_hash, settings.API_KEY
+                    )
+                except Exception as e:
+                    print(f"Error reusing vectors of file {duplicate['file_id']} for {url}: {e}")
+                if chunks_count:
+                    print(f"Reused {chunks_count} chunks of file {duplicate['file_id']} for {url}")
+            
+            if not chunks_count:
+                chunks = await extract_chunks_from_pdf_file_async(temp_file_path, settings.MODEL_NAME)
+                
+                if not chunks:
+                    print(f"No text extracted from {url}, skipping...")
+                    return False
+                
+                # Create vector store for this file with metadata tracking
+                print(f"Creating vector store with {len(chunks)} chunks for file {file_id}...")
+                try:
+                    await get_vector_store(chunks, settings.MODEL_NAME, settings.API_KEY, file_id=file_id, url_hash=url_hash)
+                except Exception as e:
+                    print(f"Error creating vector store for {url}: {e}")
+                    return False
+                chunks_count = len(chunks)
             
-            # Create vector store for this file with metadata tracking
-            print(f"Creating vector store with {len(chunks)} chunks for file {file_id}...")
-            try:
-                get_vector_store(chunks, settings.MODEL_NAME, settings.API_KEY, file_id=file_id, url_hash=url_hash)
-                processed_count += 1
-                print(f"Successfully processed file from {url}")
-            except Exception as e:
-                print(f"Error creating vector store for {url}: {e}")
-                # Roll back the processed_files entry
-                db.processed_files.delete_one({"url_hash": url_hash})
-                db.files.update_one(
-                    {"url_hash": url_hash},
-                    {"$set": {"embedding_created": False}}
-                )
+            batch_content[content_hash] = {"file_id": file_id}
+            await _record_processed_file(db, url_hash, file_id, content_hash, chunks_count)
+            print(f"Successfully processed file from {url}")
+            return True
             
         except Exception as e:
             print(f"Error processing file from {url}: {e}")
+            return False
         finally:
             if temp_file_path:
                 delete_temp_file(temp_file_path)
     
-    return processed_count
-
-
-def read_all_pdfs_text(db) -> str:
-    text = ""
-    files = list(db.files.find())
-    if not files:
-        return text
-    return text
+    # Downloads, extraction and embedding overlap across files; the index
+    # writes themselves are serialised by faiss_index.INDEX_WRITE_LOCK.
+    file_slots = asyncio.Semaphore(settings.PDF_DOWNLOAD_CONCURRENCY)
+    
+    async def process_bounded(url: str, url_hash: str) -> bool:
+        async with file_slots:
+            return await process_one(url, url_hash)
+    
+    results = await asyncio.gather(*(process_bounded(url, url_hash) for url, url_hash in download_urls))
+    return sum(results)
@@ -3,11 +3,8 @@ from app.interfaces.prompt_builder import IPromptBuilder
 
 logger = logging.getLogger(__name__)
 
-
-class PromptBuilder(IPromptBuilder):
-    
-    def build_rag_prompt(self, context: str, question: str) -> tuple[str, dict]:
-        prompt_template = """
+# Fixed strings, so the provider compiles each into a chain only once
+RAG_PROMPT_TEMPLATE = """
         Based on the provided course information, answer the following question.
         
         Course Information:
@@ -17,15 +14,25 @@ class PromptBuilder(IPromptBuilder):
         
         Please provide a helpful answer based on the available course information.
         """
-        return prompt_template, {"context": context, "question": question}
-    
-    def build_learning_path_prompt(
-        self,
-        topics: str,
-        level: str,
-        questions: str
-    ) -> tuple[str, dict]:
-        prompt_template = """
+
+BATCH_RAG_PROMPT_TEMPLATE = """
+        Based on the provided course information, answer each of the following questions.
+        
+        Course Information:
+        {context}
+        
+        Questions:
+        {questions}
+        
+        Please provide a helpful answer to every question based on the available course information.
+        
+        Format your response as JSON with this structure, with one answer per question in the same order:
+        {{
+            "answers": ["Answer to Q1", "Answer to Q2"]
+        }}
+        """
+
+LEARNING_PATH_PROMPT_TEMPLATE = """
         Based on the provided course catalog and learning requirements, create a comprehensive learning path.
         
         
@@ -53,18 +60,43 @@ class PromptBuilder(IPromptBuilder):
         
         IMPORTANT: The course_uid MUST be taken directly from the "Course UID:" field in the available courses above.
         """
-        return prompt_template, {
-            "topics": topics,
-            "level": level,
-            "questions": questions
-        }
-    
-    def build_free_chat_prompt(self, message: str) -> tuple[str, dict]:
-        prompt_template = """
+
+# The common levels are substituted ahead of time; the provider caches one
+# chain per template, so these skip formatting {level} on every request.
+LEARNING_PATH_PROMPTS_BY_LEVEL = {
+    level: LEARNING_PATH_PROMPT_TEMPLATE.replace("{level}", level)
+    for level in ("beginner", "intermediate", "advanced")
+}
+
+FREE_CHAT_PROMPT_TEMPLATE = """
         You are a helpful AI assistant. Answer the user's question or respond to their message in a clear and helpful manner.
         
         User Message: {message}
         
         Please provide a helpful response.
         """
-        return prompt_template, {"message": message}
+
+
+class PromptBuilder(IPromptBuilder):
+    
+    def build_rag_prompt(self, context: str, question: str) -> tuple[str, dict]:
+        return RAG_PROMPT_TEMPLATE, {"context": context, "question": question}
+    
+    def build_batch_rag_prompt(self, context: str, questions: list[str]) -> tuple[str, dict]:
+        numbered = "\n".join(f"Q{i}: {question}" for i, question in enumerate(questions, 1))
+        return BATCH_RAG_PROMPT_TEMPLATE, {"context": context, "questions": numbered}
+    
+    def build_learning_path_prompt(
+        self,
+        topics: str,
+        level: str,
+        questions: str
+    ) -> tuple[str, dict]:
+        variables = {"topics": topics, "questions": questions}
+        prompt_template = LEARNING_PATH_PROMPTS_BY_LEVEL.get(level)
+        if prompt_template is None:
+            return LEARNING_PATH_PROMPT_TEMPLATE, {**variables, "level": level}
+        return prompt_template, variables
+    
+    def build_free_chat_prompt(self, message: str) -> tuple[str, dict]:
+        return FREE_CHAT_PROMPT_TEMPLATE, {"message": message}
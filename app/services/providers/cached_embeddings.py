@@ -0,0 +1,58 @@
+import logging
+import threading
+import numpy as np
+from cachetools import LRUCache
+from langchain_core.embeddings import Embeddings
+from app.core.hashing import generate_chunk_digest
+
+logger = logging.getLogger(__name__)
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps another embeddings client with an in-process LRU keyed by chunk hash.
+
+    Course PDFs repeat headers, footers and template pages, so re-processed
+    files often send chunks that were embedded moments ago. Queries pass
+    straight through; they are cached at the response level instead.
+    """
+
+    def __init__(self, embeddings: Embeddings, maxsize: int):
+        self.embeddings = embeddings
+        # float32 arrays take ~3 KB per 768-d vector versus ~25 KB as a
+        # list of Python floats.
+        self._cache: LRUCache = LRUCache(maxsize=maxsize)
+        # The repository embeds batches from worker threads
+        self._lock = threading.Lock()
+
+    def _lookup(self, texts: list[str]) -> tuple[list, list[bytes], list[int]]:
+        keys = [generate_chunk_digest(text) for text in texts]
+        with self._lock:
+            vectors = [self._cache.get(key) for key in keys]
+        misses = [i for i, vector in enumerate(vectors) if vector is None]
+        if texts:
+            logger.debug("Embedding cache: %d hits, %d misses", len(texts) - len(misses), len(misses))
+        return vectors, keys, misses
+
+    def _fill(self, vectors: list, keys: list[bytes], misses: list[int], computed: list[list[float]]) -> list[list[float]]:
+        with self._lock:
+            for i, vector in zip(misses, computed):
+                self._cache[keys[i]] = np.asarray(vector, dtype=np.float32)
+        for i, vector in zip(misses, computed):
+            vectors[i] = vector
+        return [vector.tolist() if isinstance(vector, np.ndarray) else vector for vector in vectors]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors, keys, misses = self._lookup(texts)
+        computed = self.embeddings.embed_documents([texts[i] for i in misses]) if misses else []
+        return self._fill(vectors, keys, misses, computed)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors, keys, misses = self._lookup(texts)
+        computed = await self.embeddings.aembed_documents([texts[i] for i in misses]) if misses else []
+        return self._fill(vectors, keys, misses, computed)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self.embeddings.aembed_query(text)
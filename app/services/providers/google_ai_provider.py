@@ -1,4 +1,5 @@
 import logging
+from typing import AsyncIterator, Optional
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate as LCPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
@@ -13,39 +14,107 @@ class GoogleAIModelProvider(IAIModelProvider):
     def __init__(self, api_key: str, model_name: str = "gemini-2.5-flash-lite"):
         self.api_key = api_key
         self.model_name = model_name
+        self._models: dict[tuple[float, bool, Optional[int]], ChatGoogleGenerativeAI] = {}
+        self._chains: dict[tuple[str, float, bool, Optional[int]], object] = {}
+        
+        if not api_key:
+            logger.warning("Google AI API key is not configured; generation requests will fail")
+            return
+        # Build the models ChatService uses up front so the first requests
+        # don't pay for client setup.
+        for temperature, json_mode in ((0.3, False), (0.3, True), (0.7, False)):
+            self._get_model(temperature, json_mode)
     
     def validate_configuration(self) -> bool:
         if not self.api_key:
             raise HTTPException(status_code=400, detail="API key not configured")
         return True
     
-    async def generate_response(
+    def _get_model(
         self,
-        prompt: str,
-        temperature: float = 0.3,
-        variables: dict = None
-    ) -> str:
-        try:
-            self.validate_configuration()
-            
+        temperature: float,
+        json_mode: bool = False,
+        response_schema: Optional[dict] = None
+    ) -> ChatGoogleGenerativeAI:
+        # Schemas are module-level constants, so their identity is a stable key
+        key = (temperature, json_mode, id(response_schema) if response_schema else None)
+        model = self._models.get(key)
+        if model is None:
+            model_kwargs = {"response_mime_type": "application/json"} if json_mode else {}
+            if json_mode and response_schema:
+                model_kwargs["response_schema"] = response_schema
             model = ChatGoogleGenerativeAI(
                 model=self.model_name,
                 temperature=temperature,
-                google_api_key=self.api_key
+                google_api_key=self.api_key,
+                **model_kwargs
             )
-            
+            self._models[key] = model
+        return model
+    
+    def _get_chain(
+        self,
+        prompt: str,
+        temperature: float,
+        input_variables: list[str],
+        json_mode: bool = False,
+        response_schema: Optional[dict] = None
+    ):
+        # Prompt templates are fixed strings from PromptBuilder, so the
+        # compiled chains are keyed by template text and stay bounded.
+        key = (prompt, temperature, json_mode, id(response_schema) if response_schema else None)
+        chain = self._chains.get(key)
+        if chain is None:
             lc_prompt = LCPromptTemplate(
                 template=prompt,
-                input_variables=list(variables.keys()) if variables else []
+                input_variables=input_variables
             )
-            
+            model = self._get_model(temperature, json_mode, response_schema)
             chain = lc_prompt | model | StrOutputParser()
+            self._chains[key] = chain
+        return chain
+    
+    async def generate_response(
+        self,
+        prompt: str,
+        temperature: float = 0.3,
+        variables: dict = None,
+        json_mode: bool = False,
+        response_schema: Optional[dict] = None
+    ) -> str:
+        try:
+            self.validate_configuration()
             
-            response = chain.invoke(variables or {})
+            chain = self._get_chain(
+                prompt,
+                temperature,
+                list(variables.keys()) if variables else [],
+                json_mode,
+                response_schema
+            )
+            
+            response = await chain.ainvoke(variables or {})
             return response
             
         except HTTPException:
             raise
-        except Exception as e:
-            logger.error(f"Error generating response: {e}", exc_info=True)
+        except Exception:
+            logger.exception("Error generating response")
             raise
+    
+    async def stream_response(
+        self,
+        prompt: str,
+        temperature: float = 0.3,
+        variables: dict = None
+    ) -> AsyncIterator[str]:
+        self.validate_configuration()
+        
+        chain = self._get_chain(
+            prompt,
+            temperature,
+            list(variables.keys()) if variables else []
+        )
+        
+        async for chunk in chain.astream(variables or {}):
+            yield chunk
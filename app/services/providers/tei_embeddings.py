@@ -0,0 +1,58 @@
+import logging
+from typing import Optional
+import httpx
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class TEIEmbeddings(Embeddings):
+    """LangChain embeddings backed by a Text Embeddings Inference server."""
+    
+    def __init__(self, base_url: str, batch_size: int = 32, max_connections: int = 32):
+        self.embed_url = f"{base_url.rstrip('/')}/embed"
+        self.batch_size = batch_size
+        # Both clients keep connections alive across calls; the async one is
+        # created on first use so it binds to the running event loop.
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=60
+        )
+        self._client = httpx.Client(limits=self._limits, timeout=30)
+        self._async_client: Optional[httpx.AsyncClient] = None
+    
+    def _batches(self, texts: list[str]):
+        # The server pads each batch to its longest input, so batching texts
+        # of similar length wastes less compute. Yields (positions, batch)
+        # so results can be put back in the caller's order.
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for i in range(0, len(order), self.batch_size):
+            positions = order[i:i + self.batch_size]
+            yield positions, [texts[position] for position in positions]
+    
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors: list[list[float]] = [None] * len(texts)
+        for positions, batch in self._batches(texts):
+            response = self._client.post(self.embed_url, json={"inputs": batch})
+            response.raise_for_status()
+            for position, vector in zip(positions, response.json()):
+                vectors[position] = vector
+        return vectors
+    
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+    
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(limits=self._limits, timeout=30)
+        vectors: list[list[float]] = [None] * len(texts)
+        for positions, batch in self._batches(texts):
+            response = await self._async_client.post(self.embed_url, json={"inputs": batch})
+            response.raise_for_status()
+            for position, vector in zip(positions, response.json()):
+                vectors[position] = vector
+        return vectors
+    
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
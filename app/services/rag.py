@@ -1,90 +1,230 @@
-﻿import os
+﻿import asyncio
+import os
 import logging
+import numpy as np
+import orjson
 from datetime import datetime
+from functools import lru_cache
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
+from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_community.vectorstores import FAISS
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.documents import Document
 from app.core.config import settings
+from app.core.embeddings import embed_documents_concurrently, get_embeddings
+from app.services.faiss_index import (
+    COSINE_STORE_KWARGS,
+    INDEX_WRITE_LOCK,
+    maybe_upgrade_index,
+    persist_vector_store,
+    read_vector_store,
+    remove_documents,
+    remove_index_files,
+    write_file_atomic,
+)
 from fastapi import HTTPException
 
 logger = logging.getLogger(__name__)
 
 
-def get_text_chunks(text: str, model_name: str):
+@lru_cache(maxsize=2)
+def _get_text_splitter(model_name: str) -> RecursiveCharacterTextSplitter:
+    # Built once per model; split_text keeps no state between calls
     if model_name == "Google AI":
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=10000, chunk_overlap=1000)
-    else:
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    return text_splitter.split_text(text)
+        return RecursiveCharacterTextSplitter(chunk_size=10000, chunk_overlap=1000)
+    return RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+
+
+def get_text_chunks(text: str, model_name: str):
+    return _get_text_splitter(model_name).split_text(text)
+
+
+# index_dir -> ((mtime_ns, size) of index.faiss, store) for the write paths
+# below, so consecutive ingests and deletes do not re-read the docstore.
+# Every read-modify-persist holds INDEX_WRITE_LOCK, shared with the course
+# repository.
+_writable_stores: dict[str, tuple[tuple[int, int], FAISS]] = {}
+
+
+def _index_signature() -> tuple[int, int]:
+    stat = os.stat(os.path.join(settings.FAISS_INDEX_DIR, "index.faiss"))
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read_writable_store(embeddings) -> FAISS:
+    # The course repository writes to the same directory, so the cached store
+    # is only reused while index.faiss is unchanged since we last wrote it.
+    signature = _index_signature()
+    cached = _writable_stores.get(settings.FAISS_INDEX_DIR)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    vector_store = read_vector_store(settings.FAISS_INDEX_DIR, embeddings)
+    _writable_stores[settings.FAISS_INDEX_DIR] = (signature, vector_store)
+    return vector_store
 
 
-def get_vector_store(text_chunks, model_name: str, api_key: str | None = None, file_id: str | None = None, url_hash: str | None = None):
+def _file_ids_path() -> str:
+    return os.path.join(settings.FAISS_INDEX_DIR, "file_ids.json")
+
+
+def _load_file_doc_ids(vector_store: FAISS) -> dict[str, list[str]]:
+    # Same scheme as the repository's course_ids.json: the sidecar records
+    # the vector count it was written for, and a course write in between
+    # makes it stale, in which case the docstore is scanned once.
+    try:
+        with open(_file_ids_path(), "rb") as f:
+            sidecar = orjson.loads(f.read())
+        if sidecar.get("ntotal") == vector_store.index.ntotal:
+            return sidecar["files"]
+    except (FileNotFoundError, orjson.JSONDecodeError, KeyError):
+        pass
     
-    if model_name == "Google AI":
-        embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=api_key)
+    file_doc_ids: dict[str, list[str]] = {}
+    docstore = vector_store.docstore._dict if hasattr(vector_store.docstore, '_dict') else {}
+    for doc_id, doc in docstore.items():
+        metadata = getattr(doc, 'metadata', {}) or {}
+        doc_file_id = metadata.get('file_id')
+        if doc_file_id is not None:
+            file_doc_ids.setdefault(str(doc_file_id), []).append(doc_id)
+    return file_doc_ids
+
+
+def _save_file_doc_ids(vector_store: FAISS, file_doc_ids: dict[str, list[str]]) -> None:
+    write_file_atomic(_file_ids_path(), orjson.dumps({
+        "ntotal": vector_store.index.ntotal,
+        "files": file_doc_ids
+    }))
+
+
+def _store_written(vector_store: FAISS | None) -> None:
+    # Call after persisting (or with None after a failed or removed write)
+    if vector_store is None:
+        _writable_stores.pop(settings.FAISS_INDEX_DIR, None)
     else:
-        embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=api_key)
+        _writable_stores[settings.FAISS_INDEX_DIR] = (_index_signature(), vector_store)
+
+
+async def get_vector_store(text_chunks, model_name: str, api_key: str | None = None, file_id: str | None = None, url_hash: str | None = None):
+    
+    embeddings = get_embeddings(api_key)
     
     os.makedirs(settings.FAISS_INDEX_DIR, exist_ok=True)
     index_path = os.path.join(settings.FAISS_INDEX_DIR, "index.faiss")
     
-    docs_with_metadata = []
-    for chunk in text_chunks:
-        doc = Document(
-            page_content=chunk,
-            metadata={
-                "file_id": file_id or "unknown",
-                "url_hash": url_hash or "unknown",
-                "created_at": str(datetime.now())
-            }
-        )
-        docs_with_metadata.append(doc)
+    # Repeated chunks within a file (running headers, footers) are stored
+    # once. Chunks shared with other files are kept, since each file's
+    # vectors are deleted by file_id; the embedding cache avoids re-embedding
+    # them.
+    text_chunks = list(dict.fromkeys(text_chunks))
     
-    if os.path.exists(index_path):
-        try:
-            existing_store = FAISS.load_local(
-                settings.FAISS_INDEX_DIR, 
-                embeddings, 
-                allow_dangerous_deserialization=True
-            )
-            # Add new documents to existing store
-            existing_store.add_documents(docs_with_metadata)
-            existing_store.save_local(settings.FAISS_INDEX_DIR)
-            return existing_store
-        except Exception as e:
-            logger.error(f"Error loading existing index, creating new one: {e}", exc_info=True)
+    created_at = str(datetime.now())
+    metadatas = [
+        {
+            "file_id": file_id or "unknown",
+            "url_hash": url_hash or "unknown",
+            "created_at": created_at
+        }
+        for _ in text_chunks
+    ]
+    # Embedded once up front in concurrent batches, so the fallback in
+    # _write_file_vectors does not call the embedding API a second time.
+    text_embeddings = list(zip(text_chunks, await embed_documents_concurrently(embeddings, text_chunks)))
     
-    # Create new vector store with documents
-    vector_store = FAISS.from_documents(docs_with_metadata, embedding=embeddings)
-    vector_store.save_local(settings.FAISS_INDEX_DIR)
-    return vector_store
+    # Reading, growing and persisting the index is disk and CPU work
+    return await asyncio.to_thread(
+        _write_file_vectors, text_embeddings, metadatas, embeddings, index_path, file_id
+    )
 
 
-def load_vector_store(api_key: str | None = None):
-    embeddings = GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001",
-        google_api_key=api_key,
-    )
-    
+def _write_file_vectors(text_embeddings, metadatas, embeddings, index_path: str, file_id: str | None) -> FAISS:
+    with INDEX_WRITE_LOCK:
+        if os.path.exists(index_path):
+            try:
+                existing_store = _read_writable_store(embeddings)
+                file_doc_ids = _load_file_doc_ids(existing_store)
+                # Add new documents to existing store
+                new_doc_ids = existing_store.add_embeddings(text_embeddings, metadatas=metadatas)
+                maybe_upgrade_index(existing_store)
+                persist_vector_store(existing_store, settings.FAISS_INDEX_DIR, new_doc_ids=new_doc_ids)
+                file_doc_ids.setdefault(str(file_id or "unknown"), []).extend(new_doc_ids)
+                _save_file_doc_ids(existing_store, file_doc_ids)
+                _store_written(existing_store)
+                return existing_store
+            except Exception:
+                # Never fall back to a fresh index here: it would replace
+                # every other file's and course's vectors with this file's.
+                _store_written(None)
+                raise
+        
+        # Create new vector store with documents
+        vector_store = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, **COSINE_STORE_KWARGS)
+        maybe_upgrade_index(vector_store)
+        persist_vector_store(vector_store, settings.FAISS_INDEX_DIR)
+        _save_file_doc_ids(vector_store, {
+            str(file_id or "unknown"): list(vector_store.index_to_docstore_id.values())
+        })
+        _store_written(vector_store)
+        return vector_store
+
+
+def clone_vectors_for_file(source_file_id: str, file_id: str, url_hash: str, api_key: str | None = None) -> int:
+    """Copy the chunks of ``source_file_id`` under ``file_id`` without re-embedding them.
+
+    Returns the number of chunks copied; 0 means the source has no vectors
+    and the caller should process the file normally. Blocking; async
+    callers run it in a worker thread.
+    """
+    with INDEX_WRITE_LOCK:
+        return _clone_vectors_for_file(source_file_id, file_id, url_hash, api_key)
+
+
+def _clone_vectors_for_file(source_file_id: str, file_id: str, url_hash: str, api_key: str | None) -> int:
     index_path = os.path.join(settings.FAISS_INDEX_DIR, "index.faiss")
     if not os.path.exists(index_path):
-        return None
+        return 0
     
+    vector_store = _read_writable_store(get_embeddings(api_key))
+    file_doc_ids = _load_file_doc_ids(vector_store)
+    source_doc_ids = file_doc_ids.get(str(source_file_id))
+    if not source_doc_ids:
+        return 0
+    # Only the source file's documents are read from the docstore, but finding
+    # their positions inverts the whole index_to_docstore_id map (one O(ntotal)
+    # dict pass per clone); positions are not kept in the sidecar because
+    # deleting a file's vectors renumbers them.
+    docstore_id_to_index = {doc_id: position for position, doc_id in vector_store.index_to_docstore_id.items()}
+    positions = [docstore_id_to_index[doc_id] for doc_id in source_doc_ids]
+    texts = [vector_store.docstore.search(doc_id).page_content for doc_id in source_doc_ids]
+    
+    # Stored vectors are already normalized, so re-normalizing on add is a no-op.
+    # One float32 (n, d) array; its rows stack straight back into FAISS
+    # without a round trip through Python floats.
+    vectors = vector_store.index.reconstruct_batch(np.asarray(positions, dtype=np.int64))
+    created_at = str(datetime.now())
+    metadatas = [
+        {"file_id": file_id, "url_hash": url_hash, "created_at": created_at}
+        for _ in texts
+    ]
     try:
-        return FAISS.load_local(
-            settings.FAISS_INDEX_DIR, 
-            embeddings, 
-            allow_dangerous_deserialization=True
-        )
-    except Exception as e:
-        print(f"Error loading vector store: {e}")
-        return None
+        new_doc_ids = vector_store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+        maybe_upgrade_index(vector_store)
+        persist_vector_store(vector_store, settings.FAISS_INDEX_DIR, new_doc_ids=new_doc_ids)
+    except Exception:
+        _store_written(None)
+        raise
+    file_doc_ids.setdefault(str(file_id), []).extend(new_doc_ids)
+    _save_file_doc_ids(vector_store, file_doc_ids)
+    _store_written(vector_store)
+    return len(new_doc_ids)
 
 
 def delete_vectors_by_file_id(file_id: str, file_id_AI_service: str, api_key: str | None = None):
+    # Blocking; async callers run it in a worker thread
+    with INDEX_WRITE_LOCK:
+        return _delete_vectors_by_file_id(file_id, file_id_AI_service, api_key)
+
+
+def _delete_vectors_by_file_id(file_id: str, file_id_AI_service: str, api_key: str | None):
    
     try:
         
@@ -93,74 +233,52 @@ def delete_vectors_by_file_id(file_id: str, file_id_AI_service: str, api_key: st
         if not key:
             raise HTTPException(status_code=400, detail="API_KEY not provided and not found in settings")
         
-        embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",
-            google_api_key=key,
-        )
+        embeddings = get_embeddings(key)
         index_path = os.path.join(settings.FAISS_INDEX_DIR, "index.faiss")
         if not os.path.exists(index_path):
             logger.info(f"No FAISS index found for deletion of file {file_id}")
             return True
         
         try:
-            vector_store = FAISS.load_local(
-                settings.FAISS_INDEX_DIR,
-                embeddings,
-                allow_dangerous_deserialization=True
-            )
+            vector_store = _read_writable_store(embeddings)
         except Exception as e:
             logger.error(f"Error loading FAISS index: {e}", exc_info=True)
             return False
         
-        docs_to_keep = []
-        docs_deleted_count = 0
-        
-        if hasattr(vector_store, 'docstore') and hasattr(vector_store.docstore, '_dict'):
-            for doc_id, doc in vector_store.docstore._dict.items():
-                metadata = doc.metadata if hasattr(doc, 'metadata') else {}
-                
-                if str(metadata.get('file_id')) == str(file_id_AI_service):
-                    docs_deleted_count += 1
-                    logger.debug(f"Marking document {doc_id} for deletion (file_id: {file_id})")
-                    continue
-                
-                # Otherwise, keep this document
-                docs_to_keep.append(doc)
+        file_doc_ids = _load_file_doc_ids(vector_store)
+        doc_ids_to_delete = file_doc_ids.pop(str(file_id_AI_service), [])
         
+        docs_deleted_count = len(doc_ids_to_delete)
         logger.info(f"Found {docs_deleted_count} documents to delete for file {file_id}")
         
         # Handle different cases
         if docs_deleted_count == 0:
             logger.info(f"No embeddings found for file {file_id}")
             return True
-        if len(docs_to_keep) == 0:
+        if docs_deleted_count >= vector_store.index.ntotal:
             # All documents were deleted, remove the entire index
             logger.info(f"All documents deleted, removing FAISS index files")
-            index_path = os.path.join(settings.FAISS_INDEX_DIR, "index.faiss")
-            pkl_path = os.path.join(settings.FAISS_INDEX_DIR, "index.pkl")
-            docstore_path = os.path.join(settings.FAISS_INDEX_DIR, "docstore.pkl")
-            
-            for path in [index_path, pkl_path, docstore_path]:
-                if os.path.exists(path):
-                    try:
-                        os.remove(path)
-                        logger.debug(f"Deleted index file: {path}")
-                    except Exception as e:
-                        logger.warning(f"Could not delete index file {path}: {e}")
+            remove_index_files(settings.FAISS_INDEX_DIR)
+            try:
+                os.remove(_file_ids_path())
+            except FileNotFoundError:
+                pass
             
+            _store_written(None)
             return True
         
-        logger.info(f"Rebuilding FAISS index with {len(docs_to_keep)} remaining documents")
         try:
-            new_vector_store = FAISS.from_documents(
-                docs_to_keep,
-                embeddings
-            )
-            new_vector_store.save_local(settings.FAISS_INDEX_DIR)
-            logger.info(f"Successfully rebuilt FAISS index, deleted {docs_deleted_count} embeddings for file {file_id}")
+            # Prunes the vectors in place; the remaining documents are not
+            # re-embedded.
+            remove_documents(vector_store, doc_ids_to_delete)
+            persist_vector_store(vector_store, settings.FAISS_INDEX_DIR)
+            _save_file_doc_ids(vector_store, file_doc_ids)
+            _store_written(vector_store)
+            logger.info(f"Deleted {docs_deleted_count} embeddings for file {file_id}, {vector_store.index.ntotal} remaining")
             return True
         except Exception as e:
-            logger.error(f"Error rebuilding FAISS index: {e}", exc_info=True)
+            _store_written(None)
+            logger.error(f"Error deleting from FAISS index: {e}", exc_info=True)
             return False
             
     except Exception as e:
@@ -168,6 +286,7 @@ def delete_vectors_by_file_id(file_id: str, file_id_AI_service: str, api_key: st
         return False
 
 
+@lru_cache(maxsize=4)
 def get_conversational_chain(model_name: str, api_key: str | None = None):
     prompt_template = """
     Answer the question as detailed as possible from the provided context. 
@@ -1,9 +1,12 @@
 import logging
 import json
+import orjson
 from app.interfaces.response_parser import IResponseParser
 
 logger = logging.getLogger(__name__)
 
+_JSON_DECODER = json.JSONDecoder()
+
 
 class ResponseParser(IResponseParser):
     
@@ -13,19 +16,32 @@ class ResponseParser(IResponseParser):
         return response.strip()
     
     def parse_json_response(self, response: str) -> dict:
+        try:
+            # JSON mode responses parse directly; the brace slice only
+            # handles models that wrap the object in prose or fences.
+            return orjson.loads(response)
+        except orjson.JSONDecodeError:
+            pass
+        
         try:
             json_start = response.find('{')
-            json_end = response.rfind('}') + 1
-            
-            if json_start != -1 and json_end > json_start:
-                json_str = response[json_start:json_end]
-                return json.loads(json_str)
-            else:
-                return json.loads(response)
+            if json_start == -1:
+                raise json.JSONDecodeError("No JSON object found", response, 0)
+            # raw_decode parses the first complete object in one pass and
+            # ignores whatever prose or fence follows it, including stray
+            # braces a find/rfind slice would have swallowed.
+            result, _ = _JSON_DECODER.raw_decode(response, json_start)
+            return result
         except json.JSONDecodeError as e:
-            logger.warning(f"Failed to parse JSON response: {e}")
+            logger.warning("Failed to parse JSON response: %s", e)
             raise
     
+    def parse_batch_answers(self, response: str, expected: int) -> list[str]:
+        answers = self.parse_json_response(response).get("answers")
+        if not isinstance(answers, list) or len(answers) != expected:
+            raise ValueError(f"Expected {expected} answers in batched response")
+        return [self.parse_text_response(str(answer)) for answer in answers]
+    
     def parse_learning_path_response(self, response: str) -> dict:
         try:
             return self.parse_json_response(response)
@@ -0,0 +1,59 @@
+import logging
+from typing import Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticResponseCache:
+    """Caches responses by query embedding and serves near-duplicate queries."""
+    
+    def __init__(self, maxsize: int, threshold: float):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: list[Optional[tuple[str, object]]] = [None] * maxsize
+        self._next_slot = 0
+        self._size = 0
+    
+    @staticmethod
+    def _normalize(vector: list[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+    
+    def get(self, vector: list[float], key: str = "") -> Optional[object]:
+        # Entries only match when their exact key matches too, for the
+        # request fields that are not part of the embedded text.
+        if self._size == 0:
+            return None
+        query = self._normalize(vector)
+        if query.shape[0] != self._vectors.shape[1]:
+            return None
+        
+        # A few hundred entries: one matrix-vector product beats an ANN index
+        scores = self._vectors[:self._size] @ query
+        candidates = np.flatnonzero(scores >= self.threshold)
+        for slot in candidates[np.argsort(scores[candidates])[::-1]]:
+            entry_key, value = self._entries[slot]
+            if entry_key == key:
+                return value
+        return None
+    
+    def put(self, vector: list[float], value: object, key: str = "") -> None:
+        query = self._normalize(vector)
+        if self._vectors is None or self._vectors.shape[1] != query.shape[0]:
+            self._vectors = np.zeros((self.maxsize, query.shape[0]), dtype=np.float32)
+            self.clear()
+        
+        # Ring buffer: once full, the oldest entry is overwritten
+        slot = self._next_slot
+        self._vectors[slot] = query
+        self._entries[slot] = (key, value)
+        self._next_slot = (slot + 1) % self.maxsize
+        self._size = min(self._size + 1, self.maxsize)
+    
+    def clear(self) -> None:
+        self._entries = [None] * self.maxsize
+        self._next_slot = 0
+        self._size = 0